@@ -1,56 +1,156 @@
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-import pandas as pd
+import periods
 
 class Statistics:
     # ...existing code...
 
-    def calculate(self, habits):
-        """Calculate various statistics based on the habits list."""
-        self.habits = habits  # store the habit data
-        self.total_habits = len(habits)  # calculate the total number of habits
+    def calculate(self, habits, vectorized=False, db=None):
+        """
+        Calculate various statistics based on the habits list in a single pass.
 
-        total_completions = 0
-        total_days = 0
-        completed_habits = 0
-        habit_frequencies = {}
+        Args:
+            habits (list): The list of habit data.
+            vectorized (bool): Compute the per-habit statistics with the NumPy engine instead of per-date loops.
+            db (Database): With vectorized, read the completed days from this database instead of the
+            habits' logged data, so the habits only need their columns (fetch_habit_summaries).
+        """
+        self.habits = habits  # store the habit data
+        self.habits_by_id = {habit["id"]: habit for habit in habits}  # id -> habit index
+        self.results = {}  # id -> per-habit statistics
+        totals = self.new_totals()
         habit_items = []
 
-        for habit in habits:
-            status = habit["status"]
-            frequency = habit["frequency"]
-            total_completions += sum(status.values())
-            total_days += self.calculate_total_days(habit)
-            completed_habits += any(status.values())
-            time_unit = self.get_streak_with_id(habits,habit['id']).split(" ")
-            
+        if vectorized:
+            results = self.calculate_vectorized(habits, db)
+        else:
+            results = map(self.calculate_habit, habits)
+
+        for habit, result in zip(habits, results):
+            self.results[habit["id"]] = result
+            self.add_to_totals(totals, habit, result)
+
             habit_item = {
                 "Name":habit["name"],
-                "Streak":self.get_streak_with_id(habits,habit["id"]),
-                "Completions": f"{sum(status.values())} / {self.calculate_total_days(habit)} {time_unit[1]}",
+                "Streak":result["streak_label"],
+                "Completions": f"{result['completions']} / {result['total_days']} {result['unit']}",
                 "Frequency":habit["frequency"].capitalize(),
             }
             habit_items.append(habit_item)
 
+        self.habits_streaks = habit_items
+        self.set_totals(totals)
 
-            if frequency in habit_frequencies:
-                habit_frequencies[frequency] += 1
-            else:
-                habit_frequencies[frequency] = 1
+    def calculate_stream(self, habits):
+        """
+        Calculate the aggregate statistics from any iterable of habits, e.g. Database.iter_habits().
 
-        self.habits_streaks = habit_items
-        self.total_completions = total_completions
-        self.average_rate = round(total_completions / total_days, 2)
-        self.average_frequency = habit_frequencies
-        self.longest_streak = self.get_longest_streak(habits)
-        self.current_streak = self.get_current_streak(habits)
+        Only running totals are kept, no per-habit results, so memory stays fixed however many
+        habits there are. The per-habit views (results, habits_streaks) stay empty.
+
+        Args:
+            habits (iterable): The habit data, consumed once.
+        """
+        self.habits = None
+        self.habits_by_id = {}
+        self.results = {}
+        self.habits_streaks = []
+        totals = self.new_totals()
+        for habit in habits:
+            self.add_to_totals(totals, habit, self.calculate_habit(habit))
+        self.set_totals(totals)
+
+    def new_totals(self):
+        """Return empty running totals for the aggregate statistics."""
+        return {
+            "habits": 0,
+            "completions": 0,
+            "days": 0,
+            "completed_habits": 0,
+            "longest_streak": 0,
+            "current_streak": 0,
+            "frequencies": {},
+        }
+
+    def add_to_totals(self, totals, habit, result):
+        """Add the statistics of one habit to the running totals."""
+        frequency = habit["frequency"]
+        totals["habits"] += 1
+        totals["completions"] += result["completions"]
+        totals["days"] += result["total_days"]
+        totals["completed_habits"] += result["completions"] > 0
+        totals["longest_streak"] = max(totals["longest_streak"], result["streak"])
+        totals["current_streak"] = max(totals["current_streak"], result["current_streak"])
+        totals["frequencies"][frequency] = totals["frequencies"].get(frequency, 0) + 1
+
+    def merge_totals(self, totals, other):
+        """Add running totals computed elsewhere, e.g. by a worker process, to the running totals."""
+        for key in ("habits", "completions", "days", "completed_habits"):
+            totals[key] += other[key]
+        totals["longest_streak"] = max(totals["longest_streak"], other["longest_streak"])
+        totals["current_streak"] = max(totals["current_streak"], other["current_streak"])
+        for frequency, count in other["frequencies"].items():
+            totals["frequencies"][frequency] = totals["frequencies"].get(frequency, 0) + count
+
+    def set_totals(self, totals):
+        """Store the aggregate statistics from the running totals."""
+        self.total_habits = totals["habits"]
+        self.total_completions = totals["completions"]
+        self.average_rate = round(totals["completions"] / totals["days"], 2) if totals["days"] else 0
+        self.average_frequency = totals["frequencies"]
+        self.longest_streak = totals["longest_streak"]
+        self.current_streak = totals["current_streak"]
+
+    def calculate_habit(self, habit):
+        """Calculate the statistics of a single habit once, for reuse by every view."""
+        # Habits from Database.fetch_habit_periods carry completions per period instead of a status
+        completions = sum(habit["periods"].values() if "periods" in habit else habit["status"].values())
+        streak, current_streak = self.calculate_streaks(habit)
+        unit = self.get_frequency(habit["frequency"])
+        return {
+            "completions": completions,
+            "total_days": self.calculate_total_days(habit),
+            "streak": streak,
+            "current_streak": current_streak,
+            "unit": unit,
+            "streak_label": f"{streak} {unit}",
+        }
+
+    def calculate_vectorized(self, habits, db=None):
+        """Calculate the statistics of every habit at once over a habit x day completion matrix."""
+        import vectorized  # NumPy is only needed when the vectorized engine is used
+
+        if db is not None:
+            matrix = vectorized.CompletionMatrix.from_database(db, habits)
+        else:
+            matrix = vectorized.CompletionMatrix.from_habits(habits)
+        arrays = vectorized.calculate(matrix)
+        columns = zip(*(arrays[key].tolist() for key in ("completions", "total_days", "streak", "current_streak")))
+        for habit, (completions, total_days, streak, current_streak) in zip(habits, columns):
+            unit = self.get_frequency(habit["frequency"])
+            yield {
+                "completions": completions,
+                "total_days": total_days,
+                "streak": streak,
+                "current_streak": current_streak,
+                "unit": unit,
+                "streak_label": f"{streak} {unit}",
+            }
+
+    def get_result(self, habits, value_id):
+        """Look up the calculated statistics of a habit by its value ID, calculating them if needed."""
+        if habits is not getattr(self, "habits", None):
+            self.calculate(habits)
+        return self.results.get(float(value_id))
+
+    def ranked_streaks(self):
+        """Return the habit streak items sorted from the longest to the shortest streak."""
+        streaks = [result["streak"] for result in self.results.values()]
+        ranked = sorted(range(len(streaks)), key=streaks.__getitem__, reverse=True)
+        return [self.habits_streaks[index] for index in ranked]
 
     def calculate_total_days(self, habit):
         """Calculate the total days for a habit based on its frequency."""
         frequency = habit["frequency"]
-        start_date = datetime.strptime(habit["start_date"], "%Y-%m-%d").date()
-        end_date = datetime.strptime(habit["end_date"], "%Y-%m-%d").date()
-        total_days = (end_date - start_date).days + 1
+        total_days = periods.days_between(str(habit["start_date"]), str(habit["end_date"]))
 
         if frequency == "weekly":
             total_days //= 7
@@ -61,83 +161,69 @@ class Statistics:
 
     def get_longest_streak(self, habits):
         """Get the longest streak of habit completions."""
-        longest_streak = 0
-
-        for habit in habits:
-            status = habit["status"]
-            frequency = habit["frequency"]
-            streak = 0
-            max_streak = 0
-            today = datetime.today().date()
-
-            if frequency == "daily":
-                for date_str in sorted(status.keys()):
-                    date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                    if date <= today and status[date_str]:
-                        streak += 1
-                        max_streak = max(max_streak, streak)
-                    else:
-                        streak = 0
-
-            elif frequency == "weekly":
-                start_of_week = (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d")
-                for date_str in sorted(status.keys()):
-                    if date_str >= start_of_week:
-                        if status[date_str]:
-                            streak += 1
-                            max_streak = max(max_streak, streak)
-                        else:
-                            streak = 0
+        return max((self.calculate_streaks(habit)[0] for habit in habits), default=0)
 
-            elif frequency == "monthly":
-                start_of_month = today.replace(day=1).strftime("%Y-%m-%d")
-                for date_str in sorted(status.keys()):
-                    if date_str >= start_of_month:
-                        if status[date_str]:
-                            streak += 1
-                            max_streak = max(max_streak, streak)
-                        else:
-                            streak = 0
+    def get_current_streak(self, habits):
+        """Get the current streak of habit completions."""
+        return max((self.calculate_streaks(habit)[1] for habit in habits), default=0)
 
-            longest_streak = max(longest_streak, max_streak)
+    def get_bucket(self, date_str, frequency):
+        """Map a YYYY-MM-DD date to the index of its day, Monday-based week or calendar month."""
+        return periods.get_bucket(date_str, frequency)
 
-        return longest_streak
+    def get_buckets(self, habit, today):
+        """Group the completed dates of a habit into sorted, distinct period buckets in one pass."""
+        frequency = habit["frequency"]
+        # A completion counts from the period holding start_date up to today's, the most the
+        # per-period counts can tell apart, so both kinds of habit data give the same streaks
+        first = self.get_bucket(str(habit["start_date"]), frequency)
+        last = self.get_bucket(today, frequency)
+        if "periods" in habit:
+            buckets = (self.get_bucket(period_start, frequency) for period_start in sorted(habit["periods"]))
+            return [bucket for bucket in buckets if first <= bucket <= last]
+        buckets = []
+        for date_str in sorted(date_str for date_str, done in habit["status"].items() if done):
+            bucket = self.get_bucket(date_str, frequency)
+            if first <= bucket <= last and (not buckets or buckets[-1] != bucket):
+                buckets.append(bucket)
+        return buckets
+
+    def get_bucket_streaks(self, buckets, current_bucket):
+        """
+        Calculate the longest and current runs of consecutive period buckets.
 
-    def get_current_streak(self, habits):
-        """Get the current streak of habit completions."""
-        current_streak = 0
+        Args:
+            buckets (list): Sorted, distinct bucket indexes with at least one completion.
+            current_bucket (int): The bucket index of today.
 
-        for habit in habits:
-            status = habit["status"]
-            frequency = habit["frequency"]
-            today = datetime.today().date()
+        Returns:
+            tuple: The longest streak and the current streak. The current streak still counts
+            when the current period has not been logged yet but the previous one has.
+        """
+        longest_streak = 0
+        streak = 0
+        previous = None
+        for bucket in buckets:
+            streak = streak + 1 if previous is not None and bucket == previous + 1 else 1
+            longest_streak = max(longest_streak, streak)
+            previous = bucket
+        current_streak = streak if buckets and buckets[-1] >= current_bucket - 1 else 0
+        return longest_streak, current_streak
+
+    def calculate_streaks(self, habit):
+        """
+        Calculate the longest and current streak of a habit in its own frequency unit.
 
-            if frequency == "daily":
-                if status.get(today.strftime("%Y-%m-%d")):
-                    current_streak += 1
-                else:
-                    break
+        Args:
+            habit (dict): The habit data.
 
-            elif frequency == "weekly":
-                start_of_week = (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d")
-                for date_str in sorted(status.keys(), reverse=True):
-                    if date_str >= start_of_week:
-                        if status[date_str]:
-                            current_streak += 1
-                        else:
-                            break
+        Returns:
+            tuple: The longest streak and the current streak, counted in days, weeks or months.
+        """
+        today = periods.format_date(periods.today_ordinal())
+        buckets = self.get_buckets(habit, today)
+        return self.get_bucket_streaks(buckets, self.get_bucket(today, habit["frequency"]))
 
-            elif frequency == "monthly":
-                start_of_month = today.replace(day=1).strftime("%Y-%m-%d")
-                for date_str in sorted(status.keys(), reverse=True):
-                    if date_str >= start_of_month:
-                        if status[date_str]:
-                            current_streak += 1
-                        else:
-                            break
-
-        return current_streak
-    
     def get_frequency(self, frequency):
         """Get the frequency of a habit."""
         if frequency == "daily":
@@ -146,6 +232,8 @@ class Statistics:
             frequency_unit = "week(s)"
         elif frequency == "monthly":
             frequency_unit = "month(s)"
+        else:
+            frequency_unit = "day(s)"
 
         return frequency_unit
     
@@ -160,17 +248,18 @@ class Statistics:
         Returns:
             dict or None: A dictionary containing the calculated statistics for the habit, or None if no habit is found with the given value ID.
         """
-        habit_data = next((habit for habit in habits if habit["id"] == float(value_id)), None)
+        result = self.get_result(habits, value_id)
 
-        if habit_data is None:
+        if result is None:
             return None
 
-        total_completions = sum(habit_data["status"].values())
-        total_days = self.calculate_total_days(habit_data)
+        habit_data = self.habits_by_id[float(value_id)]
+        total_completions = result["completions"]
+        total_days = result["total_days"]
         completion_rate = round(total_completions / total_days, 2)
 
-        longest_streak = self.get_longest_streak([habit_data])
-        current_streak = self.get_current_streak([habit_data])
+        longest_streak = result["streak"]
+        current_streak = result["current_streak"]
 
         return {
             "value_id": value_id,
@@ -184,9 +273,7 @@ class Statistics:
 
     def show_total(self):
         """Show the total number of habits and completions."""
-        streaks_arr = self.habits_streaks
-        info = f"You have {self.total_habits} habits and {self.total_completions} completions."
-        return (f"{info}|{streaks_arr}")
+        return f"You have {self.total_habits} habits and {self.total_completions} completions."
 
     def show_average(self):
         """Show the average completion rate and frequency of habits."""
@@ -240,7 +327,7 @@ class Statistics:
 
     def get_streak_with_id(self, habits, value_id):
         """
-        Calculate the streak with the correct frequency for a habit based on its value ID.
+        Get the streak with the correct frequency for a habit based on its value ID.
 
         Args:
             habits (list): The list of habit data.
@@ -249,55 +336,9 @@ class Statistics:
         Returns:
             str or None: The streak of habit completions with the correct frequency for the specified habit, or None if no habit is found with the given value ID.
         """
-        habit_data = next((habit for habit in habits if habit["id"] == float(value_id)), None)
+        result = self.get_result(habits, value_id)
 
-        if habit_data is None:
+        if result is None:
             return None
 
-        status = habit_data["status"]
-        frequency = habit_data["frequency"]
-        unit = "day(s)"
-        streak = 0
-        current_streak = 0
-        today = datetime.today().date()
-
-        # Calculate the streak based on the habit frequency
-        if frequency == "daily":
-            # Loop through each day from today to the start date and check the completion status
-            start_date = datetime.strptime(habit_data["start_date"], "%Y-%m-%d").date()
-            for day in range((today - start_date).days + 1):
-                date = start_date + timedelta(days=day)
-                if status.get(date.strftime("%Y-%m-%d")):
-                    current_streak += 1
-                    streak = max(streak, current_streak)
-                else:
-                    current_streak = 0
-        elif frequency == "weekly":
-            unit = "week(s)"
-            # Loop through each week from today to the start date and check the completion status
-            start_date = datetime.strptime(habit_data["start_date"], "%Y-%m-%d").date()
-            for week in range((today - start_date).days // 7 + 1):
-                start_date = start_date + timedelta(weeks=week)
-                end_date = start_date + timedelta(days=6)
-                week_status = [status.get(date.strftime("%Y-%m-%d")) for date in pd.date_range(start_date, end_date)]
-                if any(week_status):
-                    current_streak += 1
-                    streak = max(streak, current_streak)
-                else:
-                    current_streak = 0
-        elif frequency == "monthly":
-            unit = "month(s)"
-            # Loop through each month from today to the start date and check the completion status
-            start_date = datetime.strptime(habit_data["start_date"], "%Y-%m-%d").date().replace(day=1)
-            for month in range((today.year - start_date.year) * 12 + (today.month - start_date.month) + 1):
-                start_date = start_date + relativedelta(months=month)
-                end_date = start_date + relativedelta(day=31)
-                end_date = min(end_date, today)  # Limit the end date to today
-                month_status = [status.get(date.strftime("%Y-%m-%d")) for date in pd.date_range(start_date, end_date)]
-                if any(month_status):
-                    current_streak += 1
-                    streak = max(streak, current_streak)
-                else:
-                    current_streak = 0
-        
-        return f"{streak} {unit}"
+        return result["streak_label"]
@@ -1,7 +1,214 @@
-from cli import CLI
+import argparse
+import json
+import os
+import sys
+import time
 
-if __name__ == "__main__":
+
+def build_parser():
+    """Build the argument parser for the non-interactive commands."""
+    parser = argparse.ArgumentParser(description="Habit tracking app. Run without a command to open the interactive menu.")
+    parser.add_argument("--db", default="habits.db", help="Path to the SQLite database (default: habits.db)")
+    parser.add_argument("--tenant", help="Use the database of this tenant (user) in the shard directories")
+    parser.add_argument("--shard-dir", action="append", metavar="DIR",
+                        help="A shard directory for tenant databases; repeat for more shards, always in the same order (default: shards)")
+    parser.add_argument("--session", action="store_true",
+                        help="In the interactive menu, stage changes and save them in batches every few seconds and at exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every database, statistics and menu call and print a report at exit (or set HABITS_PROFILE=1)")
+    parser.add_argument("--trace", action="store_true",
+                        help="Log every SQL statement and flag repeated queries and full table scans")
+    parser.add_argument("--profile-output", metavar="JSON", help="Write the profile report to a JSON file instead")
+    commands = parser.add_subparsers(dest="command")
+
+    check = commands.add_parser("check", help="Mark a habit as completed for a date")
+    check.add_argument("--id", type=int, required=True, help="ID of the habit")
+    check.add_argument("--date", help="Date of the check-in as YYYY-MM-DD (default: today)")
+
+    stats = commands.add_parser("stats", help="Show the statistics of all habits")
+    stats.add_argument("--json", action="store_true", help="Print the statistics as JSON")
+    stats.add_argument("--workers", type=int,
+                       help="Worker processes for large habit sets (default: one per CPU; 1 computes in this process)")
+    stats.add_argument("--all-tenants", action="store_true", help="Aggregate the statistics of every tenant in the shard directories")
+    stats.add_argument("--vectorized", action="store_true",
+                       help="Compute the statistics of this database with the NumPy engine, in this process")
+
+    list_habits = commands.add_parser("list", help="List the habits")
+    list_habits.add_argument("--frequency", choices=["daily", "weekly", "monthly"], help="Only list habits with this frequency")
+
+    export = commands.add_parser("export", help="Stream every habit and its completions to a file")
+    export.add_argument("--format", choices=["ndjson", "csv"], help="File format (default: from the file extension, else ndjson)")
+    export.add_argument("--output", help="File to write (default: standard output)")
+
+    load = commands.add_parser("import", help="Load habits and completions written by export")
+    load.add_argument("file", help="NDJSON or CSV file to read")
+    load.add_argument("--format", choices=["ndjson", "csv"], help="File format (default: from the file extension, else ndjson)")
+    load.add_argument("--batch-size", type=int, default=50000, help="Records written per transaction (default: 50000)")
+
+    commands.add_parser("compact", help="Strip stored 'not done' entries left by older versions and reclaim the space")
+
+    migrate = commands.add_parser("migrate", help="Apply the pending schema and data migrations in resumable chunks, with progress")
+    migrate.add_argument("--chunk-size", type=int, default=5000, help="Habit IDs rewritten per transaction (default: 5000)")
+    return parser
+
+
+def file_format(args, path):
+    """Return the format given on the command line, or the one of the file extension."""
+    if args.format:
+        return args.format
+    return "csv" if path and path.lower().endswith(".csv") else "ndjson"
+
+
+def run_check(cli, args):
+    """Check a habit as done without going through the menus."""
+    from datetime import date
+
+    start_date, end_date = cli.db.fetch_date_range(args.id)
+    if start_date is None:
+        print(f"🚫 No habit found with ID {args.id}.")
+        return 1
+    check_date = args.date or date.today().isoformat()
+    try:
+        valid = cli.validate_date(check_date, str(start_date), str(end_date))
+    except ValueError:
+        print("Invalid date format. Please use YYYY-MM-DD.")
+        return 1
+    if not valid:
+        print("Invalid date. Please select a date within the specified range.")
+        return 1
+    cli.check_habit_db({'habit_id': args.id, 'date': check_date})
+    return 0
+
+
+def run_stats(cli, args):
+    """Print the aggregate statistics from the completions per period."""
+    import parallel
+
+    if args.all_tenants:
+        from router import ShardRouter
+
+        router = ShardRouter(args.shard_dir or ["shards"])
+        stats = router.calculate_totals(args.workers)
+    elif args.vectorized:
+        from analytics import Statistics
+        from database import habit_columns
+
+        stats = Statistics()
+        stats.calculate(cli.db.fetch_habit_summaries(habit_columns), vectorized=True, db=cli.db)
+    else:
+        stats = parallel.calculate_parallel(cli.db, args.workers)
+    if args.json:
+        print(json.dumps({
+            "total_habits": stats.total_habits,
+            "total_completions": stats.total_completions,
+            "average_rate": stats.average_rate,
+            "frequencies": stats.average_frequency,
+            "longest_streak": stats.longest_streak,
+            "current_streak": stats.current_streak,
+        }))
+    else:
+        print(stats.show_total())
+        stats.show_average()
+        stats.show_streak()
+    return 0
+
+
+def run_list(cli, args):
+    """List the habits as a table."""
+    cli.tabulate_list(cli.db.fetch_habit_periods(args.frequency))
+    return 0
+
+
+def run_export(cli, args):
+    """Export the habits to a file or to standard output."""
+    import transfer
+
+    fmt = file_format(args, args.output)
+    if args.output is None:
+        transfer.export_habits(cli.db, sys.stdout, fmt)
+        return 0
+    started = time.perf_counter()
+    with open(args.output, "w", newline="", encoding="utf-8") as file:
+        habits, completions = transfer.export_habits(cli.db, file, fmt)
+    print(f"✔ Exported {habits} habit(s) and {completions} completion(s) in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+
+def run_import(cli, args):
+    """Import habits from a file and report the throughput."""
+    import transfer
+
+    started = time.perf_counter()
+    with open(args.file, newline="", encoding="utf-8") as file:
+        habits, completions = transfer.import_habits(cli.db, file, file_format(args, args.file), args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"✔ Imported {habits} habit(s) and {completions} completion(s) in {elapsed:.2f}s"
+          f" ({completions / elapsed if elapsed else 0:.0f} completions/s).")
+    return 0
+
+
+def run_compact(cli, args):
+    """Remove the stored 'not done' entries and shrink the database file."""
+    removed = cli.db.compact_statuses()
+    cli.db.conn.execute("VACUUM")
+    print(f"✔ Removed {removed} 'not done' entries.")
+    return 0
+
+
+def run_migrate(cli, args):
+    """Apply the pending migrations and report the progress of each chunk."""
+    import migrations
+
+    pending = migrations.pending(cli.db)
+    if not pending:
+        print("✔ The database is up to date.")
+        return 0
+
+    def progress(migration, done, total):
+        print(f"\r  {migration.version} {migration.name}: {done}/{total} IDs ({done / total:.0%})", end="", flush=True)
+
+    for migration in migrations.run(cli.db, args.chunk_size, progress):
+        print(f"\r✔ Applied migration {migration.version} ({migration.name}).{' ' * 30}")
+    return 0
+
+
+def main(argv=None):
+    """Run a single command, or the interactive menu when no command is given."""
+    args = build_parser().parse_args(argv)
+    # HABITS_PROFILE only switches profiling on; the report goes to a file only with --profile-output
+    profile_env = os.environ.get("HABITS_PROFILE", "").strip().lower() not in ("", "0", "false", "no", "off")
+    if args.profile or args.profile_output or profile_env:
+        import profiling
+
+        profiling.enable(args.profile_output)
+    from cli import CLI  # Imported here so --help stays instant
+
+    db_name = args.db
+    if args.tenant:
+        from router import ShardRouter
+
+        try:
+            db_name = ShardRouter(args.shard_dir or ["shards"]).path_for(args.tenant)
+        except ValueError as error:
+            print(f"🚫 {error}")
+            return 1
     # create a CLI object
-    cli = CLI()
-    # run the app
-    cli.run()
\ No newline at end of file
+    cli = CLI(db_name, trace=args.trace, session=args.session and args.command is None)
+    if args.command is None:
+        # run the app
+        cli.run()
+        return 0
+
+    commands = {"check": run_check, "stats": run_stats, "list": run_list, "export": run_export, "import": run_import,
+                "compact": run_compact, "migrate": run_migrate}
+    cli.db.connect()
+    cli.db.start_action(args.command)
+    cli.db.create_table(run_migrations=args.command != "migrate")  # migrate runs them with progress
+    try:
+        return commands[args.command](cli, args)
+    finally:
+        cli.db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from analytics import Statistics
+from cli import CLI
+from database import Database
+
+default_sizes = ["100x1", "1000x3"]  # habits x years of history
+default_mix = "daily=0.6,weekly=0.3,monthly=0.1"
+check_ins = 500  # complete_habit calls timed per dataset
+
+
+def parse_mix(mix):
+    """Parse a frequency mix such as 'daily=0.6,weekly=0.4' into a dictionary of weights."""
+    weights = {}
+    for part in mix.split(","):
+        frequency, weight = part.split("=")
+        weights[frequency.strip().lower()] = float(weight)
+    return weights
+
+
+def generate_habits(habits, years, mix, seed=0):
+    """Generate habit dictionaries with about 60% of their periods logged over the given number of years."""
+    rng = random.Random(seed)
+    end = date.today()
+    start = end - timedelta(days=int(365 * years))
+    days = (end - start).days + 1
+    step = {"daily": 1, "weekly": 7, "monthly": 30}
+    frequencies = rng.choices(list(mix), weights=list(mix.values()), k=habits)
+    return [{
+        "id": None,
+        "name": f"Habit {index}",
+        "description": "Benchmark habit",
+        "frequency": frequency,
+        "start_date": str(start),
+        "end_date": str(end),
+        "status": {str(start + timedelta(days=day)): True
+                   for day in range(0, days, step.get(frequency, 1)) if rng.random() < 0.6},
+    } for index, frequency in enumerate(frequencies)]
+
+
+def timed(function, repeat):
+    """Run function repeat times and return the best wall time in seconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def open_database(directory, name):
+    """Open a fresh database file in the given directory."""
+    db = Database(os.path.join(directory, name))
+    db.connect()
+    db.create_table()
+    return db
+
+
+def run_dataset(size, mix, repeat, directory):
+    """Time every hot path on one dataset and return a name -> seconds dictionary."""
+    habits_count, years = size.split("x")
+    habits = generate_habits(int(habits_count), float(years), mix)
+    results = {}
+
+    def insert():
+        db = open_database(directory, f"insert-{time.perf_counter_ns()}.db")
+        for habit in habits:
+            db.insert_habit(habit)
+        db.close()
+
+    results["Database.insert_habit"] = timed(insert, repeat)
+
+    db = open_database(directory, f"{size}.db")
+    db.insert_habits(habits)
+    rng = random.Random(1)
+    latest_id = db.get_latest_entry_id()
+    start = date.today() - timedelta(days=int(365 * float(years)))
+
+    def complete():
+        for _ in range(check_ins):
+            day = start + timedelta(days=rng.randrange(int(365 * float(years)) + 1))
+            db.complete_habit(rng.randint(1, latest_id), {str(day): True})
+
+    results["Database.complete_habit"] = timed(complete, repeat)
+    results["Database.fetch_all_habits"] = timed(db.fetch_all_habits, repeat)
+    results["Database.fetch_habit_periods"] = timed(db.fetch_habit_periods, repeat)
+    results["Database.fetch_streaks"] = timed(db.fetch_streaks, repeat)
+
+    fetched = db.fetch_all_habits()
+    results["Statistics.calculate"] = timed(lambda: Statistics().calculate(fetched), repeat)
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        results["Statistics.calculate[vectorized]"] = timed(lambda: Statistics().calculate(fetched, vectorized=True), repeat)
+
+    def streaks():
+        stats = Statistics()
+        for habit in fetched:
+            stats.get_streak_with_id(fetched, habit["id"])
+
+    results["Statistics.get_streak_with_id"] = timed(streaks, repeat)
+
+    cli = CLI()
+    cli.db = db
+
+    def tabulate():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli.tabulate_list(fetched)
+
+    results["CLI.tabulate_list"] = timed(tabulate, repeat)
+    db.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every benchmark against the baseline and return the names of the regressions."""
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            print(f"  {name:<60} {seconds * 1000:10.2f} ms   (new)")
+            continue
+        change = seconds / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  🚫 REGRESSION"
+        print(f"  {name:<60} {seconds * 1000:10.2f} ms   {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmark suite, write the results as JSON and optionally compare them against a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the database and analytics hot paths.")
+    parser.add_argument("--sizes", nargs="+", default=default_sizes,
+                        help=f"Datasets as HABITSxYEARS (default: {' '.join(default_sizes)})")
+    parser.add_argument("--mix", default=default_mix, help=f"Frequency mix (default: {default_mix})")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the best one is kept (default: 3)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--compare", metavar="BASELINE", help="A previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            print(f"Running dataset {size} ...")
+            for name, seconds in run_dataset(size, mix, args.repeat, directory).items():
+                results[f"{name}[{size}]"] = seconds
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mix": mix,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\n✔ Results written to {args.output}\n")
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n🚫 {len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,14 @@
+import sqlite3
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-import questionary
+import periods
 from analytics import Statistics
 from habit import Habit
-from tabulate import tabulate
 from database import Database
-import json
+from lazy import LazyModule
+
+# questionary (prompt_toolkit) and tabulate are slow to import and only needed for menus and tables
+questionary = LazyModule("questionary")
+tabulate = LazyModule("tabulate")
 
 # Reusable variables and constants
 
@@ -15,20 +18,19 @@ go_back = [{"value": back, "name": back}, {"value": menu, "name": menu}]
 dateformat = "%d.%m.%Y"
 timeformat = "%Y-%m-%d"
 today = datetime.now()
-one_month_from_now = (today + relativedelta(months=1)).strftime(timeformat)
 table_header = ["Id", "Name", "Description", "Frequency", "Longest Streak", "Start Date", "End Date"]
 habits_not_found = "\n🚫 No habit(s) found in the database.\n"
 
 
 def tablify(data, table_header):
     if table_header == "no_header":
-        tabulated = tabulate(data, tablefmt='psql', showindex=False)
+        tabulated = tabulate.tabulate(data, tablefmt='psql', showindex=False)
     elif table_header == "no_header_right":
-        tabulated = tabulate(data, tablefmt='psql', colalign=("right",), showindex=False)
+        tabulated = tabulate.tabulate(data, tablefmt='psql', colalign=("right",), showindex=False)
     elif table_header == "header_keys":
-        tabulated = tabulate(data, headers="keys", tablefmt='psql', showindex=False)
+        tabulated = tabulate.tabulate(data, headers="keys", tablefmt='psql', showindex=False)
     else:
-        tabulated = tabulate(data, headers=table_header, tablefmt='psql', showindex=False)
+        tabulated = tabulate.tabulate(data, headers=table_header, tablefmt='psql', showindex=False)
 
     print(f"\n{tabulated}\n")
 
@@ -36,9 +38,23 @@ def tablify(data, table_header):
 class CLI:
     """A class to implement the command-line interface for the app."""
 
-    def __init__(self):
-        """Initialize the CLI with a database."""
-        self.db = Database("habits.db")  # create a database object
+    def __init__(self, db_name="habits.db", trace=False, session=False):
+        """
+        Initialize the CLI with a database.
+
+        Args:
+            db_name (str): The path of the SQLite database file.
+            trace (bool): Log and check every SQL statement (see tracing.QueryTracer).
+            session (bool): Stage the writes of the menu actions and commit them in batches (see session.Session).
+        """
+        if session:
+            from session import Session
+
+            # Concurrent mode lets the session's timer thread commit on the shared connection
+            self.db = Session(Database(db_name, concurrent=True, trace=trace))
+        else:
+            self.db = Database(db_name, trace=trace)  # create a database object
+        self.session = session
 
     def run(self):
         """Run the app by parsing the user input and executing the commands."""
@@ -47,14 +63,18 @@ class CLI:
         self.welcome()  # display a welcome message
 
         while True:  # loop until the user exits
-            command = questionary.select("What do you want to do?", choices=[
+            choices = [
                 {"name": "Show a habit/ list all habits", "value": "show"},
                 {"name": "Create, update, delete a habit", "value": "modify"},
                 {"name": "Check/Complete a task", "value": "log"},
                 {"name": "View statistics", "value": "stats"},
                 {"name": "Need some help?", "value": "help"},
                 {"name": "Exit", "value": "exit"},
-            ]).ask()  # get the user input
+            ]
+            if self.session:
+                choices.insert(-1, {"name": f"Save pending changes ({self.db.pending_count()})", "value": "flush"})
+            command = questionary.select("What do you want to do?", choices=choices).ask()  # get the user input
+            self.db.start_action(command)
 
             if command == "create":
                 self.create_habit()
@@ -121,6 +141,13 @@ class CLI:
                     print(habits_not_found)
             elif command == "help":
                 self.show_help()
+            elif command == "flush":
+                try:
+                    saved = self.db.flush()
+                except sqlite3.Error as error:
+                    print(f"\n⚠ Could not save the pending changes, they are kept for the next save: {error}\n")
+                else:
+                    print(f"\n✔ Saved {saved} pending change(s).\n")
             elif command == "exit":
                 print("\n👋 Keep your habit streaks!\n🤗 Until next time, bye.\n")
                 break
@@ -159,7 +186,7 @@ class CLI:
         description = args['description']
         frequency = args['frequency']
         start_date = datetime.strptime(args['start_date'], timeformat).date() if args['start_date'] else today.date()
-        end_date = datetime.strptime(args['end_date'], timeformat).date() if args['end_date'] else one_month_from_now
+        end_date = datetime.strptime(args['end_date'], timeformat).date() if args['end_date'] else periods.format_date(periods.add_months(periods.to_ordinal(today), 1))
         status = {}
 
         habit = Habit(id, name, description, frequency, start_date, end_date, status)
@@ -171,31 +198,18 @@ class CLI:
     def list_habits(self):
         """List all habits stored in the database."""
         try:
-            habits = self.db.fetch_all_habits()
+            habits = self.db.fetch_habit_periods()  # Completions per period are all the table needs
             self.tabulate_list(habits)
         except:
             print(habits_not_found)
 
     def show_habit(self, id):
         """Show single habit stored in the database."""
-        habits = self.db.fetch_all_habits()
-        stats = Statistics()
-        stats.calculate(habits)
-        if habits:
-            data = []
-            for habit in habits:
-                if habit["id"] == id:
-                    habit_data = [
-                        habit["id"],
-                        habit["name"],
-                        habit["description"],
-                        habit["frequency"],
-                        stats.get_streak_with_id(habits, habit["id"]),
-                        habit["start_date"],
-                        habit["end_date"],
-                    ]
-                    data.append(habit_data)
-            tablify(data, table_header)
+        habit = self.db.fetch_habit(id)  # Only the shown habit's history is loaded
+        if habit:
+            stats = Statistics()
+            stats.calculate([habit])
+            tablify([self.habit_row(habit, stats)], table_header)
         else:
             print(habits_not_found)
 
@@ -237,7 +251,7 @@ class CLI:
     def update_habit_db(self, args):
         """Update an existing habit in the database with the given arguments."""
         habit_id = args["habit_id"]
-        habit = self.db.fetch_habit(habit_id)
+        habit = self.db.fetch_habit_meta(habit_id)
 
         if habit:
             name = args["name"]
@@ -292,16 +306,14 @@ class CLI:
         habit_id = args['habit_id']
         date = args['date']
 
-        habit = self.db.fetch_habit(habit_id)
+        habit = self.db.fetch_habit_meta(habit_id)  # The logged data is queried by date range instead
 
         if habit:
             frequency = habit['frequency']
-            status = habit['status']
 
-            if self.is_valid_log_date(date, frequency, status):
-                status[date] = True
-                self.update_missing_logs(status, habit['start_date'], date)  # Update missing logs
-                self.db.complete_habit(habit_id, status)
+            if self.is_valid_log_date(habit_id, date, frequency):
+                # Only the check-in is written; days without one count as not completed
+                self.db.complete_habit(habit_id, {date: True})
                 print(f"\n✔ \"{habit['name']}\" has been marked as completed for date: {date}\n")
             else:
                 print(f"\n🚫 Logging for this habit is allowed only \"{frequency.lower()}\"\n")
@@ -330,7 +342,7 @@ class CLI:
             return back
 
         try:
-            habits = self.db.fetch_habits_by_frequency(frequency_choice)
+            habits = self.db.fetch_habit_periods(frequency_choice)
             self.tabulate_list(habits)
             self.filter_by_frequency()
         except:
@@ -341,86 +353,34 @@ class CLI:
         stats = Statistics()
         stats.calculate(habits)
         if habits:
-            data = []
-            for habit in habits:
-                habit_data = [
-                    habit["id"],
-                    habit["name"],
-                    habit["description"],
-                    habit["frequency"],
-                    stats.get_streak_with_id(habits, habit["id"]),
-                    habit["start_date"],
-                    habit["end_date"],
-                ]
-                data.append(habit_data)
+            data = [self.habit_row(habit, stats) for habit in habits]
             tablify(data, table_header)
         else:
             print("\n🚫 No habits found in the database.\n")
 
-    def is_valid_log_date(self, date, frequency, status):
+    def habit_row(self, habit, stats):
+        """Build a table row for a habit from the already calculated statistics."""
+        return [
+            habit["id"],
+            habit["name"],
+            habit["description"],
+            habit["frequency"],
+            stats.results[habit["id"]]["streak_label"],
+            habit["start_date"],
+            habit["end_date"],
+        ]
+
+    def is_valid_log_date(self, habit_id, date, frequency):
         """Check if the given date is a valid log date based on the habit's frequency and existing logs."""
-        if date in status:
-            return False  # Log already exists for the given date
-
-        if frequency.lower() == "daily":
-            return True  # Log is allowed for any date since it's a daily habit
-
-        if frequency.lower() == "weekly":
-            # Check if any log exists in the same week as the given date
-            week_start = self.get_week_start(date)
-            week_end = self.get_week_end(date)
-            return not any(log_date for log_date in status if week_start <= log_date <= week_end)
-
-        if frequency.lower() == "monthly":
-            # Check if any log exists in the same month as the given date
-            month_start = self.get_month_start(date)
-            month_end = self.get_month_end(date)
-            return not any(log_date for log_date in status if month_start <= log_date <= month_end)
-
-        return False  # Invalid frequency
-
-    def get_week_start(self, date):
-        """Get the start date of the week for the given date."""
-        date_obj = datetime.strptime(date, "%Y-%m-%d").date()  # Convert input date to date object
-        week_start = date_obj - timedelta(days=date_obj.weekday())  # Subtract timedelta from date_obj
-        return week_start
-
-    def get_week_end(self, date):
-        """Get the end date of the week for the given date."""
-        date_obj = datetime.strptime(date, "%Y-%m-%d").date()  # Convert input date to date object
-        week_end = date_obj + timedelta(days=6 - date_obj.weekday())  # Add timedelta to date_obj
-        return week_end
-
-    def get_month_start(self, date):
-        """Get the start date of the month for the given date."""
-        date_obj = datetime.strptime(date, "%Y-%m-%d")  # Convert input date to datetime object
-        month_start = date_obj.replace(day=1).date()  # Set day component to 1 and convert back to date object
-        return month_start
-
-    def get_month_end(self, date):
-        """Get the end date of the month for the given date."""
-        date_obj = datetime.strptime(date, "%Y-%m-%d")  # Convert input date to datetime object
-        next_month = date.replace(day=28) + timedelta(days=4)
-        month_end = next_month - timedelta(days=next_month.day)
-        return month_end
-
-    def update_missing_logs(self, status, start_date, end_date):
-        """Update missing logs in the status dictionary from the start date to the given end date."""
-        current_date = datetime.strptime(start_date, timeformat).date()
-        end_date = datetime.strptime(end_date, timeformat).date()
-
-        while current_date <= end_date:
-            if current_date.strftime(timeformat) not in status:
-                status[current_date.strftime(timeformat)] = False
-            current_date += timedelta(days=1)
+        if frequency.lower() not in ("daily", "weekly", "monthly"):
+            return False  # Invalid frequency
+        # A habit can be logged once per day, week or month
+        start, end = periods.period_bounds(str(date), frequency.lower())
+        return not self.db.has_completion_between(habit_id, periods.format_date(start), periods.format_date(end))
 
     def validate_date(self, date, start_date, end_date):
         """Validate if the date is within the start and end date range."""
-        date_obj = self.date_to_timestamp(date)
-        start_date_obj = self.date_to_timestamp(start_date)
-        end_date_obj = self.date_to_timestamp(end_date)
-        # return start_date_obj <= date_obj <= end_date_obj
-        return start_date_obj <= date_obj <= end_date_obj
+        return periods.to_ordinal(start_date) <= periods.to_ordinal(date) <= periods.to_ordinal(end_date)
 
     def select_date(self, start_date, end_date):
         """Prompt the user to select a date for marking habit completion."""
@@ -460,7 +420,7 @@ class CLI:
     def habits_from_db(self):
         """Display the habit names available in the database for the user to choose from."""
         try:
-            habits = self.db.fetch_all_habits()
+            habits = self.db.fetch_habit_summaries(("id", "name"))
 
             if habits:
                 habit_choices = [{"name": habit["name"], "value": str(habit["id"])} for habit in habits]
@@ -472,20 +432,17 @@ class CLI:
             print(habits_not_found)
 
     def show_total_stats(self, stats, long):
-        total_streaks = stats.show_total().split("|")
-        total_streaks_arr = total_streaks[1].replace("'", "\"")
-        total_streaks_arr2 = json.loads(total_streaks_arr)
-        total_streaks_arr2.sort(key=lambda x: x["Streak"], reverse=True)
+        ranked_streaks = stats.ranked_streaks()
         if long == 1:
-            print("Your longest streak of habit completions is", total_streaks_arr2[0]["Streak"])
-            tablify([total_streaks_arr2[0]], "header_keys")
+            print("Your longest streak of habit completions is", ranked_streaks[0]["Streak"])
+            tablify([ranked_streaks[0]], "header_keys")
         else:
-            print("\n", total_streaks[0])
-            tablify(total_streaks_arr2, "header_keys")
+            print("\n", stats.show_total())
+            tablify(ranked_streaks, "header_keys")
 
     def show_stats(self):
         """Show various statistics based on your habit data."""
-        habits = self.db.fetch_all_habits()
+        habits = self.db.fetch_habit_periods()
         stats = Statistics()
         stats.calculate(habits)
 
@@ -523,11 +480,11 @@ class CLI:
                 return
             else:
                 habit_id = habit_selected
-                habit = self.db.fetch_habit(habit_id)
+                habit = stats.habits_by_id.get(float(habit_id))
                 if habit:
-                    habit_stats = stats.show_single_habit_stats(habit)
+                    habit_stats = stats.show_single(habits, habit_id, habit["name"])
                     if habit_stats:
-                        tablify([habit_stats], "header_keys")
+                        tablify(habit_stats, "no_header")
                     else:
                         print(f"\n🚫 No statistics found for habit with ID {habit_id}.\n")
                 else:
@@ -549,7 +506,3 @@ class CLI:
               "\n- To exit the app, choose the 'Exit' option."
               "\n\nNote: You can always go back by selecting the appropriate option from the menus."
               "\n")
-
-    def date_to_timestamp(self, date):
-        """Convert the date string to a timestamp for comparison."""
-        return datetime.strptime(date, "%Y-%m-%d").timestamp()
@@ -0,0 +1,88 @@
+import json
+import struct
+from periods import date_strings, parse_date
+
+# Bitmap BLOB layout: a header (format version, first day ordinal, number of days), then one bit
+# per day telling whether the habit was done, then one bit per day telling whether it was logged.
+bitmap_header = struct.Struct("<BII")
+bitmap_version = 1
+status_formats = ("rows", "bitmap")
+bit_offsets = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]  # byte -> set bits
+bit_flags = [tuple(bool(value >> bit & 1) for bit in range(8)) for value in range(256)]  # byte -> 8 booleans
+
+
+def sparse_status(status):
+    """Drop the entries of a status dictionary that are not done; a missing day means not completed."""
+    return {date_str: True for date_str, done in status.items() if done}
+
+
+def encode_bitmap(status):
+    """Encode a status dictionary as a compact bitmap BLOB."""
+    if not status:
+        return bitmap_header.pack(bitmap_version, 0, 0)
+    ordinals = {parse_date(str(date_str)): done for date_str, done in status.items()}
+    first = min(ordinals)
+    days = max(ordinals) - first + 1
+    size = (days + 7) // 8
+    done_bits = bytearray(size)
+    logged_bits = bytearray(size)
+    for ordinal, done in ordinals.items():
+        offset = ordinal - first
+        logged_bits[offset >> 3] |= 1 << (offset & 7)
+        if done:
+            done_bits[offset >> 3] |= 1 << (offset & 7)
+    return bitmap_header.pack(bitmap_version, first, days) + bytes(done_bits) + bytes(logged_bits)
+
+
+def decode_bitmap(blob):
+    """Decode a bitmap BLOB into a status dictionary ordered by date."""
+    version, first, days = bitmap_header.unpack_from(blob)
+    if version != bitmap_version:
+        raise ValueError(f"Unsupported bitmap status version: {version}")
+    size = (days + 7) // 8
+    done_bits = blob[bitmap_header.size:bitmap_header.size + size]
+    logged_bits = blob[bitmap_header.size + size:]
+    ordinals = []
+    values = []
+    for index, logged in enumerate(logged_bits):
+        if not logged:
+            continue  # Skip eight unlogged days at once
+        start = first + index * 8
+        done = bit_flags[done_bits[index]]
+        if logged == 0xFF:
+            ordinals.extend(range(start, start + 8))
+            values.extend(done)
+        else:
+            for bit in bit_offsets[logged]:
+                ordinals.append(start + bit)
+                values.append(done[bit])
+    return dict(zip(map(date_strings.__getitem__, ordinals), values))
+
+
+def bitmap_dates_between(blob, start_date, end_date):
+    """Return the completed dates from start_date to end_date (inclusive) of a bitmap BLOB, reading only the bits in range."""
+    version, first, days = bitmap_header.unpack_from(blob)
+    if version != bitmap_version:
+        raise ValueError(f"Unsupported bitmap status version: {version}")
+    start = max(parse_date(start_date) - first, 0)
+    end = min(parse_date(end_date) - first, days - 1)
+    offset = bitmap_header.size
+    return [date_strings[first + day] for day in range(start, end + 1) if blob[offset + (day >> 3)] >> (day & 7) & 1]
+
+
+def encode_status(status, status_format="json"):
+    """Encode a status dictionary as JSON text or as a bitmap BLOB."""
+    if status_format == "bitmap":
+        return encode_bitmap(status)
+    return json.dumps(status)
+
+
+def decode_status(value):
+    """Decode a stored status value (JSON text, bitmap BLOB or None) into a dictionary; dictionaries pass through unchanged."""
+    if value is None:
+        return {}
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return decode_bitmap(bytes(value))
+    return json.loads(value)
@@ -0,0 +1,19 @@
+import pytest
+
+
+@pytest.fixture
+def make_habit():
+    """Return a function that builds a habit dictionary, with the given fields replacing the defaults."""
+    def make(**kwargs):
+        habit = {
+            "id": None,
+            "name": "Exercise",
+            "description": "Daily workout routine",
+            "frequency": "daily",
+            "start_date": "2023-07-01",
+            "end_date": "2023-07-31",
+            "status": {},
+        }
+        habit.update(kwargs)
+        return habit
+    return make
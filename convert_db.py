@@ -0,0 +1,26 @@
+import argparse
+import os
+from database import Database
+
+
+def main():
+    """Convert the logged data of a habits database to another status format."""
+    parser = argparse.ArgumentParser(description="Convert how a habits database stores logged data.")
+    parser.add_argument("database", help="Path to the SQLite database, e.g. habits.db")
+    parser.add_argument("status_format", choices=["rows", "bitmap"],
+                        help="'rows' keeps one completions row per date, 'bitmap' packs the history into a BLOB per habit")
+    args = parser.parse_args()
+
+    db = Database(args.database)
+    db.connect()
+    db.create_table()
+    before = os.path.getsize(args.database)
+    db.convert_status_format(args.status_format)
+    db.cursor.execute("VACUUM")  # Give the freed pages back to the file system
+    db.close()
+    after = os.path.getsize(args.database)
+    print(f"✔ Converted {args.database} to \"{args.status_format}\" ({before} -> {after} bytes)")
+
+
+if __name__ == "__main__":
+    main()
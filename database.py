@@ -1,162 +1,1015 @@
+import os
 import sqlite3
 import random
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.request import pathname2url
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
 import json
+import migrations
+import periods
+from codec import bitmap_dates_between, decode_status, encode_bitmap, sparse_status, status_formats
+from habit import Habit
 
 today = datetime.now()
 timeformat = "%Y-%m-%d"
+habit_columns = ("id", "name", "description", "frequency", "start_date", "end_date")  # Every column except status
+busy_timeout = 5000  # Milliseconds a connection waits for a lock before raising "database is locked"
+mmap_size = 256 * 1024 * 1024
+habit_cache_size = 1024  # Habit rows kept decoded in memory by fetch_habit and fetch_habit_meta
+rollup_periods = ("weekly", "monthly")  # Periods with a completion count per habit in period_completions
+# SQL expressions for the first day of the (Monday-based) week and of the month of a YYYY-MM-DD date
+period_start_sql = {
+    "weekly": "date({0}, '-' || ((CAST(strftime('%w', {0}) AS INTEGER) + 6) % 7) || ' days')",
+    "monthly": "date({0}, 'start of month')",
+}
+# SQL expressions for the streak bucket of a YYYY-MM-DD date, equal to periods.get_bucket()
+ordinal_sql = "(CAST(julianday({0}) + 0.5 AS INTEGER) - 1721425)"  # Julian day number -> date.toordinal()
+bucket_sql = {
+    "daily": ordinal_sql,
+    "weekly": f"(({ordinal_sql} - 1) / 7)",
+    "monthly": "(CAST(strftime('%Y', {0}) AS INTEGER) * 12 + CAST(strftime('%m', {0}) AS INTEGER) - 1)",
+}
 
 class Database:
     """A class to handle the connection and interaction with the SQLite database."""
 
-    def __init__(self, db_name):
-        """Initialize the database with the given name."""
+    def __init__(self, db_name, concurrent=False, pool_size=4, trace=False, read_only=False, cache_size=habit_cache_size):
+        """
+        Initialize the database with the given name.
+
+        Args:
+            db_name (str): The path of the SQLite database file.
+            concurrent (bool): Open the database in WAL mode with one writer connection and a pool of
+            read connections, so the object can be shared between threads. Requires a database file.
+            pool_size (int): The maximum number of read connections in concurrent mode.
+            trace (bool): Log every SQL statement to stderr and flag repeated queries and full table
+            scans (see tracing.QueryTracer).
+            read_only (bool): Open an existing database file read-only, e.g. in a worker process
+            (see parallel.py). The schema must already exist, create_table() is not needed.
+            cache_size (int): The number of habit rows kept in the LRU cache of fetch_habit,
+            fetch_habit_meta and fetch_date_range; 0 disables it. Writes through this object drop
+            the rows they change, and commits by other connections drop the whole cache.
+        """
         self.db_name = db_name
+        self.concurrent = concurrent
+        self.pool_size = pool_size
         self.conn = None
         self.cursor = None
+        self.status_format = "rows"  # Where logged data is stored: completions rows or a bitmap BLOB
+        self.write_lock = threading.RLock()  # Serializes writes on the writer connection
+        self.write_depth = 0  # Number of nested writer() blocks held by writer_thread
+        self.writer_thread = None
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.readers_opened = 0
+        self.trace = trace
+        self.tracer = None
+        self.read_only = read_only
+        self.cache_size = cache_size
+        self.habit_cache = OrderedDict()  # habit ID -> Habit, least recently used first
+        self.cache_lock = threading.Lock()
+        self.cache_generation = 0  # Incremented by every invalidation
+        self.cache_data_version = None  # PRAGMA data_version the cached rows were read at
+        self.version_conn = None  # The connection data_version is read on: a dedicated one in concurrent mode
+        self.version_lock = threading.Lock()
+        self.writer_data_version = None  # PRAGMA data_version of the writer connection after the last write
+        self.written_ids = set()  # Habit IDs invalidated by the running write (None: all), dropped again when it ends
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def connect(self):
         """Connect to the database and create a cursor."""
-        self.conn = sqlite3.connect(self.db_name)
+        if self.concurrent:
+            self.conn = self.open_connection()
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL, fsyncs only at checkpoints
+            self.pool = queue.Queue(maxsize=self.pool_size)
+            self.readers_opened = 0
+            # Readers check for outside commits here, so they neither wait for writes nor for each other
+            self.version_conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            self.writer_data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        elif self.read_only:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_name))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, timeout=busy_timeout / 1000)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'status_format'").fetchone()
+            self.status_format = row[0] if row else "rows"
+        else:
+            self.conn = sqlite3.connect(self.db_name)
+        if self.trace:
+            import tracing  # Only loaded when tracing
+
+            self.tracer = tracing.QueryTracer(self.db_name)
+            self.conn.set_trace_callback(self.tracer)
+        self.version_conn = self.version_conn or self.conn
         self.cursor = self.conn.cursor()
 
-    def create_table(self):
-        """Create a table in the database to store habit records."""
-        sql = """CREATE TABLE IF NOT EXISTS habits (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            description TEXT,
-            frequency TEXT,
-            start_date TEXT,
-            end_date TEXT,
-            status TEXT
-        )"""
-        self.cursor.execute(sql)
-        self.conn.commit()
+    def open_connection(self, read_only=False):
+        """Open a connection that may be shared between threads, one at a time, with tuned pragmas."""
+        conn = sqlite3.connect(self.db_name, timeout=busy_timeout / 1000, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+        conn.execute(f"PRAGMA mmap_size = {mmap_size}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        if self.tracer:
+            conn.set_trace_callback(self.tracer)
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """
+        Yield a new cursor on the writer connection while holding the write lock.
+
+        The outermost block commits when it ends, or rolls back on an error, so methods that call
+        each other share one transaction.
+        """
+        with self.write_lock:
+            self.write_depth += 1
+            self.writer_thread = threading.get_ident()
+            try:
+                yield self.conn.cursor()
+            except BaseException:
+                if self.write_depth == 1:
+                    self.conn.rollback()
+                raise
+            else:
+                if self.write_depth == 1:
+                    self.conn.commit()
+                    if self.version_conn is not self.conn:
+                        self.acknowledge_commit()
+            finally:
+                self.write_depth -= 1
+                if not self.write_depth:
+                    self.writer_thread = None
+                    written, self.written_ids = self.written_ids, set()
+                    if written != set():
+                        # Readers on other threads may have cached the old rows since the invalidation
+                        self.invalidate_habits(written)
+
+    @contextmanager
+    def reader(self):
+        """Yield a new cursor for reading, on a pooled read connection in concurrent mode."""
+        if self.pool is None or self.writer_thread == threading.get_ident():
+            # Reads inside a write see its uncommitted changes
+            yield self.conn.cursor()
+            return
+        conn = self.borrow_reader()
+        try:
+            yield conn.cursor()
+        finally:
+            self.pool.put(conn)
+
+    def borrow_reader(self):
+        """Take a read connection from the pool, opening a new one while the pool is not full."""
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self.pool_lock:
+            if self.readers_opened < self.pool_size:
+                self.readers_opened += 1
+                return self.open_connection(read_only=True)
+        return self.pool.get()  # Wait for another thread to give a connection back
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several writes into one transaction that is committed (or rolled back) as a whole.
+
+        The per-call commits of the mutating methods are suppressed inside the block, so a bulk
+        load is a single commit. Nested blocks join the outermost transaction.
+        """
+        with self.writer():
+            yield self
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        Drop the completions date index for the duration of a large load and rebuild it once at the end.
+
+        Keeping the index and the period rollups up to date row by row makes bulk inserts several
+        times slower. If the process dies mid-load, create_table() restores them on the next start.
+        """
+        with self.writer() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS idx_completions_date")
+            # The rollups are rebuilt in one GROUP BY at the end instead of by a trigger per row
+            for trigger in ("insert", "update", "delete"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS completions_rollup_{trigger}")
+        try:
+            yield self
+        finally:
+            with self.writer() as cursor:
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_completions_date ON completions (date)")
+                self.create_rollup_triggers()
+                self.rebuild_rollups()
+
+    def create_table(self, run_migrations=True):
+        """
+        Create the tables in the database to store habit records and their completions.
+
+        Args:
+            run_migrations (bool): Apply the pending migrations (see migrations.py) right away.
+        """
+        with self.writer() as cursor:
+            sql = """CREATE TABLE IF NOT EXISTS habits (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                description TEXT,
+                frequency TEXT,
+                start_date TEXT,
+                end_date TEXT,
+                status TEXT
+            )"""
+            cursor.execute(sql)
+            # One row per logged date; the composite primary key doubles as the (habit_id, date) index
+            sql = """CREATE TABLE IF NOT EXISTS completions (
+                habit_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (habit_id, date)
+            ) WITHOUT ROWID"""
+            cursor.execute(sql)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_completions_date ON completions (date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_habits_frequency ON habits (frequency)")
+            # Completions per habit and week or month, so statistics read one row per period
+            sql = """CREATE TABLE IF NOT EXISTS period_completions (
+                habit_id INTEGER NOT NULL,
+                period TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                completions INTEGER NOT NULL,
+                PRIMARY KEY (habit_id, period, period_start)
+            ) WITHOUT ROWID"""
+            cursor.execute(sql)
+            rollups_missing = not self.create_rollup_triggers()
+            cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = cursor.execute("SELECT value FROM meta WHERE key = 'status_format'").fetchone()
+            self.status_format = row[0] if row else "rows"
+            migrations.create_table(cursor)
+        if run_migrations:
+            # Each chunk commits on its own, so this must not run inside the transaction above
+            migrations.run(self)
+        if rollups_missing:
+            self.rebuild_rollups()  # A database from before the rollups, or an interrupted bulk load
+
+    def create_rollup_triggers(self):
+        """
+        Create the triggers that keep period_completions in step with the completions rows.
+
+        Returns:
+            bool: Whether the triggers already existed.
+        """
+        with self.writer() as cursor:
+            sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'completions_rollup_%'"
+            if cursor.execute(sql).fetchone()[0] == 3:
+                return True
+            # Every trigger adds a +1 or -1 delta to the week and month of the changed row
+            upsert = """INSERT INTO period_completions (habit_id, period, period_start, completions)
+                        VALUES ({row}.habit_id, 'weekly', {weekly}, {delta}), ({row}.habit_id, 'monthly', {monthly}, {delta})
+                        ON CONFLICT (habit_id, period, period_start)
+                        DO UPDATE SET completions = completions + excluded.completions;
+                        DELETE FROM period_completions WHERE habit_id = {row}.habit_id AND completions <= 0;"""
+            events = {
+                "insert": ("AFTER INSERT ON completions WHEN NEW.done", "NEW", "1"),
+                "update": ("AFTER UPDATE OF done ON completions WHEN (NEW.done != 0) != (OLD.done != 0)",
+                           "NEW", "(NEW.done != 0) - (OLD.done != 0)"),
+                "delete": ("AFTER DELETE ON completions WHEN OLD.done", "OLD", "-1"),
+            }
+            for name, (event, row, delta) in events.items():
+                body = upsert.format(row=row, delta=delta,
+                                     weekly=period_start_sql["weekly"].format(f"{row}.date"),
+                                     monthly=period_start_sql["monthly"].format(f"{row}.date"))
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS completions_rollup_{name} {event} BEGIN {body} END")
+            cursor.execute("""CREATE TRIGGER IF NOT EXISTS habits_rollup_delete AFTER DELETE ON habits
+                              BEGIN DELETE FROM period_completions WHERE habit_id = OLD.id; END""")
+            return False
+
+    def rebuild_rollups(self):
+        """Recompute period_completions from the stored logged data."""
+        with self.writer() as cursor:
+            cursor.execute("DELETE FROM period_completions")
+            if self.status_format == "bitmap":
+                for habit_id, blob in cursor.execute("SELECT id, status FROM habits").fetchall():
+                    self.refresh_rollups(habit_id, decode_status(blob))
+                return
+            for period in rollup_periods:
+                sql = f"""INSERT INTO period_completions (habit_id, period, period_start, completions)
+                          SELECT habit_id, '{period}', {period_start_sql[period].format("date")}, COUNT(*)
+                          FROM completions WHERE done GROUP BY 1, 3"""
+                cursor.execute(sql)
+
+    def refresh_rollups(self, habit_id, status):
+        """Replace the period_completions rows of a habit, for the bitmap format that has no triggers."""
+        counts = {}
+        for date_str, done in status.items():
+            if done:
+                for period in rollup_periods:
+                    key = (period, periods.period_start(date_str, period))
+                    counts[key] = counts.get(key, 0) + 1
+        with self.writer() as cursor:
+            cursor.execute("DELETE FROM period_completions WHERE habit_id = ?", (habit_id,))
+            sql = "INSERT INTO period_completions (habit_id, period, period_start, completions) VALUES (?, ?, ?, ?)"
+            cursor.executemany(sql, ((habit_id, period, start, count) for (period, start), count in counts.items()))
+
+    def migrate_status_json(self, id_range=None):
+        """
+        Convert logged data still stored as JSON text in the legacy 'status' column to the status format of the database.
+
+        Args:
+            id_range (tuple): Only convert the habits with a first <= ID <= last, if given.
+        """
+        where, params = self.habit_filter("habits", id_range=id_range)
+        where += (" AND" if where else " WHERE") + " typeof(status) = 'text'"
+        with self.writer() as cursor:
+            self.invalidate_habits()
+            rows = cursor.execute(f"SELECT id, status FROM habits{where}", params).fetchall()
+            for habit_id, status_json in rows:
+                status = sparse_status(json.loads(status_json) if status_json else {})
+                if self.status_format == "bitmap":
+                    cursor.execute("UPDATE habits SET status = ? WHERE id = ?", (encode_bitmap(status), habit_id))
+                    self.refresh_rollups(habit_id, status)
+                else:
+                    self.upsert_completions(habit_id, status)
+            if rows and self.status_format == "rows":
+                cursor.execute(f"UPDATE habits SET status = NULL{where}", params)
+
+    def convert_status_format(self, status_format):
+        """Convert the logged data of every habit to the given status format ('rows' or 'bitmap')."""
+        if status_format not in status_formats:
+            raise ValueError(f"Unknown status format: {status_format}")
+        if status_format == self.status_format:
+            return
+        with self.writer() as cursor:
+            self.invalidate_habits()
+            if status_format == "bitmap":
+                statuses = self.fetch_statuses()
+                for (habit_id,) in cursor.execute("SELECT id FROM habits").fetchall():
+                    sql = "UPDATE habits SET status = ? WHERE id = ?"
+                    cursor.execute(sql, (encode_bitmap(sparse_status(statuses.get(habit_id, {}))), habit_id))
+                cursor.execute("DELETE FROM completions")
+            else:
+                for habit_id, blob in cursor.execute("SELECT id, status FROM habits").fetchall():
+                    self.upsert_completions(habit_id, decode_status(blob))
+                cursor.execute("UPDATE habits SET status = NULL")
+            sql = "INSERT OR REPLACE INTO meta (key, value) VALUES ('status_format', ?)"
+            cursor.execute(sql, (status_format,))
+            self.status_format = status_format
+            self.rebuild_rollups()
+
+    def compact_statuses(self):
+        """Strip the stored 'not done' entries left by older versions and return how many were removed."""
+        with self.writer() as cursor:
+            self.invalidate_habits()
+            if self.status_format == "bitmap":
+                removed = 0
+                for habit_id, blob in cursor.execute("SELECT id, status FROM habits").fetchall():
+                    status = decode_status(blob)
+                    completed = sparse_status(status)
+                    if len(completed) < len(status):
+                        removed += len(status) - len(completed)
+                        cursor.execute("UPDATE habits SET status = ? WHERE id = ?", (encode_bitmap(completed), habit_id))
+                return removed
+            return cursor.execute("DELETE FROM completions WHERE done = 0").rowcount
+
+    def merge_status(self, habit_id, log_data):
+        """Merge log_data into the stored status of a habit; entries that are not done remove the completion."""
+        if self.status_format == "bitmap":
+            with self.writer() as cursor:
+                self.invalidate_habits((habit_id,))
+                row = cursor.execute("SELECT status FROM habits WHERE id = ?", (habit_id,)).fetchone()
+                status = decode_status(row[0] if row else None)
+                status.update(log_data)
+                status = sparse_status(status)
+                sql = "UPDATE habits SET status = ? WHERE id = ?"
+                cursor.execute(sql, (encode_bitmap(status), habit_id))
+                if row:
+                    self.refresh_rollups(habit_id, status)
+        else:
+            self.upsert_completions(habit_id, log_data)
+
+    def upsert_completions(self, habit_id, log_data):
+        """Insert or overwrite one completions row per date in log_data."""
+        self.upsert_completion_rows((habit_id, date, done) for date, done in log_data.items())
+
+    def upsert_completion_rows(self, rows):
+        """Insert (habit_id, date, done) completions rows of existing habits; rows that are not done delete the completion."""
+        sql = """INSERT INTO completions (habit_id, date, done)
+                 SELECT ?1, ?2, 1 WHERE EXISTS (SELECT 1 FROM habits WHERE id = ?1)
+                 ON CONFLICT (habit_id, date) DO UPDATE SET done = 1"""
+        done_rows = []
+        missed = []
+        for habit_id, date, done in rows:
+            (done_rows if done else missed).append((habit_id, date))
+        with self.writer() as cursor:
+            self.invalidate_habits({habit_id for habit_id, _ in done_rows} | {habit_id for habit_id, _ in missed})
+            # Only completed days are stored, so storage grows with check-ins rather than calendar days
+            cursor.executemany(sql, done_rows)
+            if missed:
+                cursor.executemany("DELETE FROM completions WHERE habit_id = ? AND date = ?", missed)
+
+    def fetch_status(self, habit_id):
+        """Build the status dictionary of a habit from its completions rows."""
+        sql = "SELECT date, done FROM completions WHERE habit_id = ? ORDER BY date"
+        with self.reader() as cursor:
+            cursor.execute(sql, (habit_id,))
+            return {date: bool(done) for date, done in cursor.fetchall()}
+
+    def fetch_statuses(self, frequency=None):
+        """Build the status dictionaries of many habits at once, keyed by habit ID."""
+        statuses = {}
+        with self.reader() as cursor:
+            for habit_id, date, done in cursor.execute(*self.completions_query(frequency)).fetchall():
+                statuses.setdefault(habit_id, {})[date] = bool(done)
+        return statuses
+
+    def completions_query(self, frequency=None):
+        """Return the SQL and parameters selecting the (habit_id, date, done) completions rows in habit ID and date order."""
+        if frequency is None:
+            return "SELECT habit_id, date, done FROM completions ORDER BY habit_id, date", ()
+        sql = """SELECT c.habit_id, c.date, c.done FROM completions c
+                 JOIN habits h ON h.id = c.habit_id
+                 WHERE h.frequency = ? ORDER BY c.habit_id, c.date"""
+        return sql, (frequency.lower(),)
 
     def insert_habit(self, habit_dict):
         """Insert a habit record into the database table."""
-        # Convert the 'status' value to JSON string
-        habit_dict['status'] = json.dumps(habit_dict['status'])
+        # The status may arrive already encoded, e.g. from Habit.to_database_dict
+        status = sparse_status(decode_status(habit_dict.get('status')))
+        if self.status_format == "bitmap":
+            habit_dict = dict(habit_dict, status=encode_bitmap(status))
+        else:
+            # Logged data lives in the completions table; the 'status' column stays empty
+            habit_dict = dict(habit_dict, status=None)
+        sql = """INSERT INTO habits (id, name, description, frequency, start_date, end_date, status)
+                 VALUES (:id, :name, :description, :frequency, :start_date, :end_date, :status)"""
+        with self.writer() as cursor:
+            cursor.execute(sql, habit_dict)
+            self.invalidate_habits((cursor.lastrowid,))
+            if self.status_format == "rows":
+                self.upsert_completions(cursor.lastrowid, status)
+            else:
+                self.refresh_rollups(cursor.lastrowid, status)
+
+    def insert_habits(self, habit_dicts):
+        """Insert many habit records in one transaction with batched statements."""
+        habit_dicts = [dict(habit_dict) for habit_dict in habit_dicts]
         sql = """INSERT INTO habits (id, name, description, frequency, start_date, end_date, status)
                  VALUES (:id, :name, :description, :frequency, :start_date, :end_date, :status)"""
-        self.cursor.execute(sql, habit_dict)
-        self.conn.commit()
+        with self.writer() as cursor:
+            next_id = (self.get_latest_entry_id() or 0) + 1
+            completion_rows = []
+            bitmap_statuses = []
+            for habit_dict in habit_dicts:
+                if habit_dict.get('id') is None:
+                    # IDs are assigned up front so the completions rows can refer to them
+                    habit_dict['id'] = next_id
+                next_id = max(next_id, habit_dict['id'] + 1)
+                status = sparse_status(decode_status(habit_dict.get('status')))
+                if self.status_format == "bitmap":
+                    habit_dict['status'] = encode_bitmap(status)
+                    bitmap_statuses.append((habit_dict['id'], status))
+                else:
+                    habit_dict['status'] = None
+                    completion_rows.extend((habit_dict['id'], date, done) for date, done in status.items())
+            cursor.executemany(sql, habit_dicts)
+            self.invalidate_habits(habit_dict['id'] for habit_dict in habit_dicts)
+            self.upsert_completion_rows(completion_rows)
+            for habit_id, status in bitmap_statuses:
+                self.refresh_rollups(habit_id, status)
 
     def update_habit(self, habit_id, habit_dict):
         """Update multiple attributes of a habit record in the database table."""
         set_clauses = []
         values = []
-        for key, value in habit_dict.items():
-            if value is not None:
-                if key == 'status':
-                    # Fetch the current status dictionary from the habit record
-                    current_status = self.fetch_habit(habit_id).get('status') or {}
-                    # Update the current status dictionary with the new data
-                    current_status.update(value)
-                    # Convert the updated status to JSON string
-                    value = json.dumps(current_status)
-                set_clauses.append(f"{key} = ?")
-                values.append(value)
-        if set_clauses:
-            set_clause = ", ".join(set_clauses)
-            values.append(habit_id)
-            sql = f"UPDATE habits SET {set_clause} WHERE id = ?"
-            self.cursor.execute(sql, values)
-            self.conn.commit()
+        with self.writer() as cursor:
+            self.invalidate_habits((habit_id,))
+            for key, value in habit_dict.items():
+                if value is not None:
+                    if key == 'status':
+                        # Merge the new data into the stored status of the habit
+                        self.merge_status(habit_id, decode_status(value))
+                        continue
+                    set_clauses.append(f"{key} = ?")
+                    values.append(value)
+            if set_clauses:
+                set_clause = ", ".join(set_clauses)
+                values.append(habit_id)
+                sql = f"UPDATE habits SET {set_clause} WHERE id = ?"
+                cursor.execute(sql, values)
 
     def delete_habit(self, id):
-        """Delete a habit record from the database table."""
-        sql = "DELETE FROM habits WHERE id = ?"
-        self.cursor.execute(sql, (id,))
-        self.conn.commit()
+        """Delete a habit record and its completions from the database tables."""
+        with self.writer() as cursor:
+            self.invalidate_habits((id,))
+            cursor.execute("DELETE FROM completions WHERE habit_id = ?", (id,))
+            cursor.execute("DELETE FROM habits WHERE id = ?", (id,))
+
+    def cached_habit(self, habit_id, with_status=False):
+        """
+        Return a copy of the cached row of a habit and count a hit, or count a miss and return None.
+
+        Args:
+            habit_id (int or str): The ID of the habit; the menus pass it as a string.
+            with_status (bool): Only count a hit when the logged data of the habit is cached too.
+        """
+        habit_id = int(habit_id)
+        if self.habit_cache:
+            self.check_data_version()
+        with self.cache_lock:
+            habit = self.habit_cache.get(habit_id)
+            if habit is None or (with_status and "status" not in habit):
+                self.cache_misses += 1
+                return None
+            self.habit_cache.move_to_end(habit_id)
+            self.cache_hits += 1
+        return habit.copy(with_logs=with_status)  # Callers may change the copy
+
+    def check_data_version(self):
+        """
+        Drop the cache when another connection or process committed since the rows were cached.
+
+        SQLite changes PRAGMA data_version on a connection whenever another connection commits to
+        the file, e.g. a cron "app.py check" or a second Database object. In concurrent mode it is
+        read on a connection of its own, so cached reads never wait for the write lock.
+        """
+        with self.version_lock:
+            version = self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.cache_data_version:
+                self.invalidate_habits()
+                self.cache_data_version = version
+
+    def acknowledge_commit(self):
+        """
+        Let the version connection take a commit on the writer connection as already handled.
+
+        A commit through this object changes the data_version of the version connection, while its
+        rows were dropped from the cache by their writes. Called with the write lock held, right
+        after the commit: the writer connection's own data_version, read last, still catches
+        another connection committing around it.
+        """
+        with self.version_lock:
+            version = self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+            writer_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if writer_version != self.writer_data_version:
+                self.invalidate_habits()
+            self.writer_data_version = writer_version
+            self.cache_data_version = version
+
+    def cache_generation_for_read(self):
+        """Return the cache generation a read starts in, or None when its result must not be cached."""
+        if not self.cache_size or self.write_depth:
+            return None  # Reads during a write may see changes that are not committed yet
+        self.check_data_version()
+        return self.cache_generation
+
+    def cache_habit(self, habit, generation):
+        """Store a copy of a habit row read in the given cache generation, unless it was invalidated meanwhile."""
+        with self.cache_lock:
+            if generation is None or generation != self.cache_generation:
+                return
+            if habit.id not in self.habit_cache or "status" in habit:
+                self.habit_cache[habit.id] = habit.copy()
+            self.habit_cache.move_to_end(habit.id)
+            while len(self.habit_cache) > self.cache_size:
+                self.habit_cache.popitem(last=False)
+
+    def invalidate_habits(self, ids=None):
+        """Drop the cached rows of the given habit IDs, or of every habit."""
+        ids = None if ids is None else {int(habit_id) for habit_id in ids}
+        with self.cache_lock:
+            self.cache_generation += 1
+            if ids is None:
+                self.habit_cache.clear()
+            else:
+                for habit_id in ids:
+                    self.habit_cache.pop(habit_id, None)
+        if self.write_depth and self.writer_thread == threading.get_ident():
+            # Dropped again when the write ends
+            if ids is None:
+                self.written_ids = None
+            elif self.written_ids is not None:
+                self.written_ids |= ids
+
+    def cache_info(self):
+        """Return the hits, misses, current size and maximum size of the habit cache."""
+        with self.cache_lock:
+            return {"hits": self.cache_hits, "misses": self.cache_misses,
+                    "size": len(self.habit_cache), "max_size": self.cache_size}
 
     def fetch_habit(self, id):
-        """Fetch a habit record from the database table by its ID."""
-        sql = "SELECT * FROM habits WHERE id = ?"
-        self.cursor.execute(sql, (id,))
-        row = self.cursor.fetchone()
-        if row:
-            habit_dict = {
-                "id": row[0],
-                "name": row[1],
-                "description": row[2],
-                "frequency": row[3],
-                "start_date": row[4],
-                "end_date": row[5],
-                "status": json.loads(row[6])  # Convert the 'status' value from JSON string to a Python object
-            }
-            return habit_dict
+        """Fetch a habit record from the database table by its ID, from the habit cache when possible."""
+        habit = self.cached_habit(id, with_status=True)
+        if habit is not None:
+            return habit
+        generation = self.cache_generation_for_read()
+        sql = "SELECT id, name, description, frequency, start_date, end_date, status FROM habits WHERE id = ?"
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row  # Bitmap statuses are decoded from the row
+            habit = cursor.execute(sql, (id,)).fetchone()
+        if habit:
+            if self.status_format == "rows":
+                habit.status = self.fetch_status(habit.id)
+            self.cache_habit(habit, generation)
+            return habit
         else:
             return None
 
     def fetch_all_habits(self):
-        """Fetch all habit records from the database table and return them as a list of dictionaries."""
-        habits = []
-        sql = "SELECT * FROM habits"
-        self.cursor.execute(sql)
-        rows = self.cursor.fetchall()
-        for row in rows:
-            habit_dict = {
-                "id": row[0],
-                "name": row[1],
-                "description": row[2],
-                "frequency": row[3],
-                "start_date": row[4],
-                "end_date": row[5],
-                "status": json.loads(row[6])  # Convert the 'status' value from JSON string to a Python object
-            }
-            habits.append(habit_dict)
+        """Fetch all habit records from the database table and return them as a list of Habit objects."""
+        sql = "SELECT id, name, description, frequency, start_date, end_date, status FROM habits"
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row
+            habits = cursor.execute(sql).fetchall()
+        if self.status_format == "rows":
+            self.attach_statuses(habits, self.fetch_statuses())
         return habits
     
     def fetch_habits_by_frequency(self, frequency):
-        """Fetch all habit records with a specific frequency from the database table and return them as a list of dictionaries."""
-        habits = []
-        sql = "SELECT * FROM habits WHERE frequency = ?"
-        self.cursor.execute(sql, (frequency.lower(),))
-        rows = self.cursor.fetchall()
-        for row in rows:
-            habit_dict = {
-                "id": row[0],
-                "name": row[1],
-                "description": row[2],
-                "frequency": row[3],
-                "start_date": row[4],
-                "end_date": row[5],
-                "status": json.loads(row[6])  # Convert the 'status' value from JSON string to a Python object
-            }
-            habits.append(habit_dict)
+        """Fetch all habit records with a specific frequency from the database table and return them as a list of Habit objects."""
+        sql = "SELECT id, name, description, frequency, start_date, end_date, status FROM habits WHERE frequency = ?"
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row
+            habits = cursor.execute(sql, (frequency.lower(),)).fetchall()
+        if self.status_format == "rows":
+            self.attach_statuses(habits, self.fetch_statuses(frequency))
         return habits
+
+    def attach_statuses(self, habits, statuses):
+        """Set the status of every habit from a habit ID -> status dictionary built from the completions rows."""
+        for habit in habits:
+            habit.status = statuses.get(habit.id, {})
     
+    def iter_habits(self, batch_size=500, frequency=None):
+        """
+        Yield habits one at a time, reading rows in batches so memory stays bounded.
+
+        Args:
+            batch_size (int): The number of rows fetched from SQLite at once.
+            frequency (str): Only yield habits with this frequency, if given.
+
+        Yields:
+            Habit: The habit records in ID order, with their logged data.
+        """
+        sql = f"SELECT {', '.join(habit_columns)}, status FROM habits"
+        params = ()
+        if frequency is not None:
+            sql += " WHERE frequency = ?"
+            params = (frequency.lower(),)
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row
+            cursor.execute(sql + " ORDER BY id", params)
+            if self.status_format == "rows":
+                # Merge join with the completions, which come grouped in the same habit ID order
+                sql, params = self.completions_query(frequency)
+                completions = self.iter_row_groups(cursor.connection.cursor(), sql, params, batch_size)
+                pending = next(completions, None)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for habit in rows:
+                    if self.status_format == "bitmap":
+                        yield habit
+                        continue
+                    while pending is not None and pending[0] < habit.id:
+                        pending = next(completions, None)  # Completions of a habit that no longer exists
+                    if pending is not None and pending[0] == habit.id:
+                        status = pending[1]
+                        habit.status = dict(zip(status, map(bool, status.values())))
+                        pending = next(completions, None)
+                    yield habit
+
+    def fetch_packed_periods(self):
+        """
+        Fetch the completed periods of every habit packed into one row per habit, for bulk loading.
+
+        Weekly and monthly habits get their periods from period_completions, daily habits their
+        completed days from the completions rows. In the bitmap format daily habits are left out,
+        see fetch_daily_bitmaps().
+
+        Returns:
+            list: (habit_id, period_starts, completions) rows; period_starts concatenates the
+            YYYY-MM-DD start dates, 10 characters each, and completions is their total.
+        """
+        with self.reader() as cursor:
+            sql = """SELECT h.id, group_concat(p.period_start, ''), SUM(p.completions) FROM habits h
+                     CROSS JOIN period_completions p ON p.habit_id = h.id AND p.period = h.frequency
+                     GROUP BY h.id"""
+            rows = cursor.execute(sql).fetchall()
+            if self.status_format == "rows":
+                sql = """SELECT h.id, group_concat(c.date, ''), COUNT(*) FROM habits h
+                         CROSS JOIN completions c ON c.habit_id = h.id
+                         WHERE h.frequency NOT IN ('weekly', 'monthly') AND c.done GROUP BY h.id"""
+                rows += cursor.execute(sql).fetchall()
+        return rows
+
+    def fetch_daily_bitmaps(self):
+        """Fetch (habit_id, bitmap BLOB) rows of the daily habits in the bitmap format; none in the rows format."""
+        if self.status_format != "bitmap":
+            return []
+        with self.reader() as cursor:
+            sql = "SELECT id, status FROM habits WHERE frequency NOT IN ('weekly', 'monthly') AND status IS NOT NULL"
+            return cursor.execute(sql).fetchall()
+
+    def fetch_habit_summaries(self, columns=("id", "name"), frequency=None, id_range=None):
+        """
+        Fetch selected columns of all habit records without loading their logged data.
+
+        Args:
+            columns (tuple): The habit columns to fetch, any of habit_columns.
+            frequency (str): Only fetch habits with this frequency, if given.
+            id_range (tuple): Only fetch habits with a first <= ID <= last, if given.
+
+        Returns:
+            list: Habit objects with only the selected columns set.
+        """
+        unknown = set(columns) - set(habit_columns)
+        if unknown:
+            raise ValueError(f"Unknown habit column(s): {', '.join(sorted(unknown))}")
+        where, params = self.habit_filter("habits", frequency, id_range)
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row
+            cursor.execute(f"SELECT {', '.join(columns)} FROM habits{where} ORDER BY id", params)
+            return cursor.fetchall()
+
+    def habit_filter(self, table, frequency=None, id_range=None, id_column=None):
+        """
+        Build the WHERE clause selecting habits by frequency and ID range.
+
+        Args:
+            table (str): The name or alias of the habits table in the query.
+            frequency (str): Only select habits with this frequency, if given.
+            id_range (tuple): Only select habits with a first <= ID <= last, if given.
+            id_column (str): The column the ID range is matched against (default: the habits ID).
+
+        Returns:
+            tuple: The clause (empty, or starting with " WHERE ") and its parameters.
+        """
+        conditions = []
+        params = []
+        if frequency is not None:
+            conditions.append(f"{table}.frequency = ?")
+            params.append(frequency.lower())
+        if id_range is not None:
+            conditions.append(f"{id_column or table + '.id'} BETWEEN ? AND ?")
+            params.extend(id_range)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), tuple(params)
+
+    def fetch_id_range(self):
+        """Return the lowest habit ID, the highest and the number of habits."""
+        with self.reader() as cursor:
+            return cursor.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM habits").fetchone()
+
+    def fetch_habit_periods(self, frequency=None, id_range=None):
+        """
+        Fetch all habit records with their completions per period instead of their logged data.
+
+        Weekly and monthly habits get one count per period from period_completions, daily habits
+        one entry per completed day, so the data grows with periods rather than calendar days.
+
+        Args:
+            frequency (str): Only fetch habits with this frequency, if given.
+            id_range (tuple): Only fetch habits with a first <= ID <= last, if given.
+
+        Returns:
+            list: Habit objects whose "periods" maps period start dates to completions.
+        """
+        return list(self.iter_habit_periods(frequency=frequency, id_range=id_range))
+
+    def iter_habit_periods(self, batch_size=500, frequency=None, id_range=None):
+        """
+        Yield habits one at a time with their completions per period, reading rows in batches.
+
+        The streaming counterpart of fetch_habit_periods(): the habits and their periods come in
+        the same habit ID order and are merged as they are read, so memory stays bounded.
+
+        Args:
+            batch_size (int): The number of rows fetched from SQLite at once.
+            frequency (str): Only yield habits with this frequency, if given.
+            id_range (tuple): Only yield habits with a first <= ID <= last, if given.
+
+        Yields:
+            Habit: The habit records in ID order, whose "periods" maps period start dates to completions.
+        """
+        frequency = frequency.lower() if frequency else None
+        bitmap = self.status_format == "bitmap"
+        where, params = self.habit_filter("h", frequency, id_range)
+        columns = ", ".join(habit_columns)
+        if bitmap:
+            # The completed days of daily habits are only in their bitmaps
+            columns += ", CASE WHEN frequency IN ('weekly', 'monthly') THEN NULL ELSE status END AS status"
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row
+            cursor.execute(f"SELECT {columns} FROM habits h{where} ORDER BY id", params)
+            # CROSS JOIN keeps habits as the outer loop, so the rows come in habit ID order unsorted
+            groups = []
+            if frequency is None or frequency in rollup_periods:
+                sql = f"""SELECT h.id, p.period_start, p.completions FROM habits h
+                          CROSS JOIN period_completions p ON p.habit_id = h.id AND p.period = h.frequency
+                          {where} ORDER BY h.id, p.period_start"""
+                groups.append(self.iter_row_groups(cursor.connection.cursor(), sql, params, batch_size))
+            if not bitmap and (frequency is None or frequency not in rollup_periods):
+                # The periods of daily habits are their completed days
+                daily_where = where + (" AND" if where else " WHERE") + " h.frequency NOT IN ('weekly', 'monthly')"
+                sql = f"""SELECT h.id, c.date, 1 FROM habits h CROSS JOIN completions c ON c.habit_id = h.id
+                          {daily_where} AND c.done ORDER BY h.id, c.date"""
+                groups.append(self.iter_row_groups(cursor.connection.cursor(), sql, params, batch_size))
+            pending = [next(group, None) for group in groups]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for habit in rows:
+                    if bitmap:
+                        habit.periods = dict.fromkeys(sparse_status(habit.status), 1)
+                        del habit.status
+                    else:
+                        habit.periods = {}
+                    for index, group in enumerate(groups):
+                        while pending[index] is not None and pending[index][0] < habit.id:
+                            pending[index] = next(group, None)  # Rows of a habit added after the habits were read
+                        if pending[index] is not None and pending[index][0] == habit.id:
+                            habit.periods.update(pending[index][1])
+                            pending[index] = next(group, None)
+                    yield habit
+
+    def iter_row_groups(self, cursor, sql, params, batch_size):
+        """Yield (habit_id, {key: value}) pairs from a query of (habit_id, key, value) rows ordered by habit ID."""
+        cursor.execute(sql, params)
+        habit_id = None
+        values = {}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row_habit_id, key, value in rows:
+                if row_habit_id != habit_id:
+                    if habit_id is not None:
+                        yield habit_id, values
+                    habit_id = row_habit_id
+                    values = {}
+                values[key] = value
+        if habit_id is not None:
+            yield habit_id, values
+
+    def fetch_streaks(self, frequency=None, today=None):
+        """
+        Compute the longest and current streak of every habit inside SQLite.
+
+        Each completed day (daily habits) or week or month (from period_completions) becomes a
+        bucket number, and consecutive buckets are grouped into runs by subtracting their
+        ROW_NUMBER(), so only one row per habit comes back. The buckets and the current streak
+        rule match Statistics.calculate_streaks. In the bitmap format the days of daily habits
+        are not in SQL, so those habits are computed from their decoded bitmaps instead.
+
+        Args:
+            frequency (str): Only compute the streaks of habits with this frequency, if given.
+            today (str): The YYYY-MM-DD date the current streaks end at, today by default.
+
+        Returns:
+            dict: Habit ID -> (longest streak, current streak), counted in the habit's own unit.
+        """
+        today = today or periods.format_date(periods.today_ordinal())
+        frequency = frequency.lower() if frequency else None
+        streaks = {habit["id"]: (0, 0) for habit in self.fetch_habit_summaries(("id",), frequency)}
+        daily_where = "h.frequency NOT IN ('weekly', 'monthly') AND (:frequency IS NULL OR h.frequency = :frequency)"
+        # CROSS JOIN keeps habits as the outer loop, so completions are read by primary key ranges
+        # instead of through idx_completions_date, which the planner otherwise prefers
+        sources = []
+        if self.status_format == "rows":
+            sources.append(f"""SELECT c.habit_id, {bucket_sql["daily"].format("c.date")} AS bucket,
+                                      {bucket_sql["daily"].format(":today")} AS today_bucket
+                               FROM habits h CROSS JOIN completions c
+                                 ON c.habit_id = h.id AND c.date BETWEEN h.start_date AND :today
+                               WHERE {daily_where} AND c.done""")
+        for period in rollup_periods:
+            start = period_start_sql[period]
+            sources.append(f"""SELECT p.habit_id, {bucket_sql[period].format("p.period_start")} AS bucket,
+                                      {bucket_sql[period].format(":today")} AS today_bucket
+                               FROM habits h CROSS JOIN period_completions p ON p.habit_id = h.id AND p.period = h.frequency
+                               WHERE h.frequency = '{period}' AND (:frequency IS NULL OR h.frequency = :frequency)
+                                 AND p.period_start BETWEEN {start.format("h.start_date")} AND {start.format(":today")}""")
+        sql = f"""WITH buckets AS ({" UNION ALL ".join(sources)}),
+                  islands AS (
+                      SELECT habit_id, bucket, today_bucket,
+                             bucket - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY bucket) AS island
+                      FROM buckets
+                  ),
+                  runs AS (
+                      SELECT habit_id, COUNT(*) AS length, MAX(bucket) AS last_bucket, MAX(today_bucket) AS today_bucket
+                      FROM islands GROUP BY habit_id, island
+                  )
+                  SELECT habit_id, MAX(length),
+                         MAX(CASE WHEN last_bucket >= today_bucket - 1 THEN length ELSE 0 END)
+                  FROM runs GROUP BY habit_id"""
+        with self.reader() as cursor:
+            params = {"today": today, "frequency": frequency}
+            for habit_id, longest, current in cursor.execute(sql, params):
+                streaks[habit_id] = (longest, current)
+            if self.status_format == "bitmap":
+                from analytics import Statistics  # Only the daily habits of bitmap databases need it
+
+                stats = Statistics()
+                cursor.execute(f"SELECT h.id, h.frequency, h.start_date, h.status FROM habits h WHERE {daily_where}", params)
+                for habit_id, habit_frequency, start_date, blob in cursor.fetchall():
+                    habit = {"frequency": habit_frequency, "start_date": start_date, "status": decode_status(blob)}
+                    streaks[habit_id] = stats.get_bucket_streaks(stats.get_buckets(habit, today),
+                                                                 stats.get_bucket(today, habit_frequency))
+        return streaks
+
+    def fetch_habit_meta(self, id):
+        """Fetch a habit record by its ID without loading its logged data, from the habit cache when possible."""
+        habit = self.cached_habit(id)
+        if habit is not None:
+            return habit
+        generation = self.cache_generation_for_read()
+        sql = f"SELECT {', '.join(habit_columns)} FROM habits WHERE id = ?"
+        with self.reader() as cursor:
+            cursor.row_factory = Habit.from_row
+            habit = cursor.execute(sql, (id,)).fetchone()
+        if not habit:
+            return None
+        self.cache_habit(habit, generation)
+        return habit
+
+    def fetch_completions_between(self, habit_id, start_date, end_date):
+        """Fetch the completed dates of a habit from start_date to end_date (inclusive), in order."""
+        with self.reader() as cursor:
+            if self.status_format == "bitmap":
+                row = cursor.execute("SELECT status FROM habits WHERE id = ?", (habit_id,)).fetchone()
+                return bitmap_dates_between(row[0], str(start_date), str(end_date)) if row and row[0] else []
+            # A range scan on the (habit_id, date) primary key
+            sql = "SELECT date FROM completions WHERE habit_id = ? AND date BETWEEN ? AND ? AND done ORDER BY date"
+            cursor.execute(sql, (habit_id, str(start_date), str(end_date)))
+            return [date for (date,) in cursor.fetchall()]
+
+    def has_completion_between(self, habit_id, start_date, end_date):
+        """Check whether a habit was completed on any day from start_date to end_date (inclusive)."""
+        if self.status_format == "bitmap":
+            return bool(self.fetch_completions_between(habit_id, start_date, end_date))
+        sql = "SELECT EXISTS (SELECT 1 FROM completions WHERE habit_id = ? AND date BETWEEN ? AND ? AND done)"
+        with self.reader() as cursor:
+            cursor.execute(sql, (habit_id, str(start_date), str(end_date)))
+            return bool(cursor.fetchone()[0])
+
     def fetch_date_range(self, id):
         """Fetch the start_date and end_date from the database for a specific habit record ID."""
-        sql = "SELECT start_date, end_date FROM habits WHERE id = ?"
-        self.cursor.execute(sql, (id,))
-        result = self.cursor.fetchone()
-        if result:
-            start_date, end_date = result
-            return start_date, end_date
+        habit = self.fetch_habit_meta(id)  # Caches the row for the check-in that usually follows
+        if habit:
+            return habit["start_date"], habit["end_date"]
         else:
             return None, None
 
     def complete_habit(self, id, log_data):
-        """Log habit data and update the 'status' column in the database table."""
-        habit = self.fetch_habit(id)
-        if habit:
-            status = habit['status'] or {}  # Retrieve the current status or initialize as an empty dictionary
-            status.update(log_data)  # Update the status dictionary with the log_data
-            # Convert the updated status to JSON string
-            status_json = json.dumps(status)
-            sql = "UPDATE habits SET status = ? WHERE id = ?"
-            self.cursor.execute(sql, (status_json, id))
-            self.conn.commit()
+        """Log habit data as single-row upserts into the completions table, or into the bitmap of the habit."""
+        self.merge_status(id, log_data)  # Unknown habit IDs are ignored
     
+    def complete_habits(self, log_items):
+        """
+        Log habit data for many habits in one transaction.
+
+        Args:
+            log_items (dict or iterable): Maps habit IDs to log data dictionaries, either as a
+            dictionary or as (habit_id, log_data) pairs. Unknown habit IDs are ignored.
+        """
+        if isinstance(log_items, dict):
+            log_items = log_items.items()
+        with self.writer():
+            if self.status_format == "bitmap":
+                for habit_id, log_data in log_items:
+                    self.merge_status(habit_id, log_data)
+            else:
+                self.upsert_completion_rows((habit_id, date, done)
+                                            for habit_id, log_data in log_items
+                                            for date, done in log_data.items())
+
+    def complete_habit_rows(self, rows):
+        """Log (habit_id, date, done) rows for many habits in one transaction; unknown habit IDs are ignored."""
+        with self.writer():
+            if self.status_format == "bitmap":
+                log_items = {}
+                for habit_id, date, done in rows:
+                    log_items.setdefault(habit_id, {})[date] = done
+                for habit_id, log_data in log_items.items():
+                    self.merge_status(habit_id, log_data)
+            else:
+                self.upsert_completion_rows(rows)
+
+    def delete_habits(self, ids):
+        """Delete many habit records and their completions in one transaction."""
+        ids = [(id,) for id in ids]
+        with self.writer() as cursor:
+            self.invalidate_habits(id for (id,) in ids)
+            cursor.executemany("DELETE FROM completions WHERE habit_id = ?", ids)
+            cursor.executemany("DELETE FROM habits WHERE id = ?", ids)
+
     def get_latest_entry_id(self):
         """Get the ID of the latest entry based on the maximum 'id' value in the 'habits' table."""
         sql = "SELECT MAX(id) FROM habits"
-        self.cursor.execute(sql)
-        result = self.cursor.fetchone()
+        with self.reader() as cursor:
+            cursor.execute(sql)
+            result = cursor.fetchone()
         if result:
             latest_id = result[0]
             return latest_id
@@ -165,9 +1018,14 @@ class Database:
         
     def clear_habit_status(self, habit_id):
         """Clear the logged data in the status column of a habit."""
-        sql = "UPDATE habits SET status = '{}' WHERE id = ?"
-        self.cursor.execute(sql, (habit_id,))
-        self.conn.commit()
+        sql = "DELETE FROM completions WHERE habit_id = ?"
+        with self.writer() as cursor:
+            self.invalidate_habits((habit_id,))
+            cursor.execute(sql, (habit_id,))
+            if self.status_format == "bitmap":
+                sql = "UPDATE habits SET status = ? WHERE id = ?"
+                cursor.execute(sql, (encode_bitmap({}), habit_id))
+                cursor.execute("DELETE FROM period_completions WHERE habit_id = ?", (habit_id,))
         
     def generate_predefined_habits(self):
         """Generate predefined habits and store them in the database."""
@@ -213,24 +1071,34 @@ class Database:
             habit['start_date'] = start_date
             habit['end_date'] = end_date
             habit['status'] = self.generate_logged_status(start_date, end_date, habit['frequency'])
-            self.insert_habit(habit)
+        self.insert_habits(predefined_habits)
 
     def generate_logged_status(self,start_date, end_date, frequency):
-        start_datetime = datetime.strptime(start_date, timeformat)
-        end_datetime = datetime.strptime(end_date, timeformat)
-        days = (end_datetime - start_datetime).days + 1
+        start = periods.to_ordinal(start_date)
+        days = periods.days_between(start_date, end_date)
 
         if frequency == 'daily':
-            return {str((start_datetime + timedelta(days=i)).date()): random.choice([True, False]) for i in range(days)}
+            return {periods.format_date(start + i): random.choice([True, False]) for i in range(days)}
         elif frequency == 'weekly':
-            return {str((start_datetime + timedelta(weeks=i)).date()): random.choice([True, False]) for i in range(days // 7)}
+            return {periods.format_date(start + i * 7): random.choice([True, False]) for i in range(days // 7)}
         elif frequency == 'monthly':
-            return {str((start_datetime + relativedelta(months=i)).date()): random.choice([True, False]) for i in range(days // 30)}
+            return {periods.format_date(periods.add_months(start, i)): random.choice([True, False]) for i in range(days // 30)}
         else:
             return {}
 
 
+    def start_action(self, name):
+        """Mark the start of a user action, so the tracer groups the queries that follow under it."""
+        if self.tracer:
+            self.tracer.start_action(name)
+
     def close(self):
-        """Close the connection and cursor."""
+        """Close the connection, the cursor and the pooled read connections."""
+        if self.tracer:
+            self.tracer.close()
         self.cursor.close()
-        self.conn.close()
\ No newline at end of file
+        if self.version_conn is not self.conn:
+            self.version_conn.close()
+        self.conn.close()
+        while self.pool is not None and not self.pool.empty():
+            self.pool.get_nowait().close()
\ No newline at end of file
@@ -1,18 +1,122 @@
 import datetime
-import json
+from codec import decode_status, encode_status
+
+fields = ("id", "name", "description", "frequency", "start_date", "end_date", "status", "periods")
+last_layout = (None, None)  # The cursor.description from_row saw last and how its rows map to fields
+
+
+def row_layout(description):
+    """
+    Return how the rows of a query map to habit fields: "status" for the seven habits columns in
+    table order, "meta" for the six before status, or a tuple of the column names otherwise.
+    """
+    global last_layout
+    if description is not last_layout[0]:  # One description per query, so this runs once per query
+        names = tuple(column for column, *_ in description)
+        if names == fields[:7]:
+            layout = "status"
+        elif names == fields[:6]:
+            layout = "meta"
+        else:
+            layout = names
+        last_layout = (description, layout)
+    return last_layout[1]
+
 
 class Habit:
-    """A class to represent a habit object."""
+    """
+    A class to represent a habit object.
+
+    Database builds Habit objects directly from its rows (see from_row), and Statistics and CLI read
+    them like the habit dictionaries they used before: habit["name"], "status" in habit, dict(habit).
+    A field that was not fetched, such as the status of fetch_habit_meta() or the periods of
+    fetch_habit_periods(), is simply not set. __slots__ keeps each habit several times smaller than
+    a dictionary.
+    """
 
-    def __init__(self, id, name, description, frequency, start_date, end_date, status):
-        """Initialize the habit with the given attributes."""
+    __slots__ = fields
+
+    def __init__(self, id, name, description, frequency, start_date, end_date, status=None):
+        """Initialize the habit with the given attributes; a status of None leaves the logged data unset."""
         self.id = id
         self.name = name
         self.description = description
         self.frequency = frequency
         self.start_date = start_date
         self.end_date = end_date
-        self.status = status
+        if status is not None:
+            self.status = status
+
+    @staticmethod
+    def from_row(cursor, row):
+        """
+        Build a habit from a row of a habits query; used as a sqlite3 row_factory.
+
+        Rows of the seven habits columns in table order get their status decoded from the bitmap
+        BLOB (or set empty, to be filled from the completions rows), rows of the six other columns
+        in table order get no status, and any other selection is matched to the columns by name.
+        """
+        layout = row_layout(cursor.description)
+        if layout == "status":
+            return Habit(*row[:6], decode_status(row[6]))
+        if layout == "meta":
+            return Habit(*row)
+        habit = Habit.__new__(Habit)
+        for column, value in zip(layout, row):
+            setattr(habit, column, decode_status(value) if column == "status" else value)
+        return habit
+
+    def keys(self):
+        """Return the names of the fields that are set."""
+        return [field for field in fields if hasattr(self, field)]
+
+    def items(self):
+        """Return (name, value) pairs of the fields that are set."""
+        return [(field, getattr(self, field)) for field in fields if hasattr(self, field)]
+
+    def get(self, field, default=None):
+        """Return a field, or default when it is not set."""
+        return getattr(self, field, default) if field in fields else default
+
+    def __getitem__(self, field):
+        if field not in fields:
+            raise KeyError(field)
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field) from None
+
+    def __setitem__(self, field, value):
+        if field not in fields:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in fields and hasattr(self, field)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Habit, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Habit({', '.join(f'{field}={value!r}' for field, value in self.items())})"
+
+    def copy(self, with_logs=True):
+        """Return a copy whose status and periods can be changed freely, or without them."""
+        habit = Habit.__new__(Habit)
+        for field, value in self.items():
+            if field in ("status", "periods"):
+                if not with_logs:
+                    continue
+                value = dict(value)
+            setattr(habit, field, value)
+        return habit
 
     def create(self):
         """Create a new habit and return it as a dictionary."""
@@ -23,7 +127,7 @@ class Habit:
             "frequency": self.frequency,
             "start_date": self.start_date,
             "end_date": self.end_date,
-            "status": self.status
+            "status": self.get("status", {})
         }
         return habit_dict
 
@@ -49,20 +153,28 @@ class Habit:
     def complete(self, date):
         """Mark the habit as completed for the given date."""
         if date >= self.start_date and date <= self.end_date:
+            if "status" not in self:
+                self.status = {}
             self.status[date] = True
         else:
             print("Invalid date")
 
-    def to_database_dict(self):
-        """Convert the habit object to a dictionary suitable for database insertion."""
+    def to_database_dict(self, status_format=None):
+        """
+        Convert the habit object to a dictionary suitable for database insertion.
+
+        Database encodes the status itself, so by default it is passed on as a dictionary instead
+        of being encoded here and decoded again. Give a status_format ("json" or "bitmap") to get
+        the encoded value, e.g. for storing it elsewhere.
+        """
         habit_dict = self.create()
-        # Convert the 'status' dictionary to JSON string
-        habit_dict['status'] = json.dumps(habit_dict['status'])
+        if status_format is not None:
+            habit_dict['status'] = encode_status(habit_dict['status'], status_format)
         return habit_dict
 
     @staticmethod
     def from_database_dict(habit_dict):
         """Create a Habit object from a dictionary retrieved from the database."""
-        # Convert the 'status' JSON string to a dictionary
-        habit_dict['status'] = json.loads(habit_dict['status'])
-        return Habit(**habit_dict)
\ No newline at end of file
+        # Convert the 'status' JSON string or bitmap BLOB to a dictionary
+        habit_dict['status'] = decode_status(habit_dict['status'])
+        return Habit(**habit_dict)
@@ -0,0 +1,16 @@
+import importlib
+
+
+class LazyModule:
+    """A stand-in for a module that is only imported on first attribute access, to keep startup fast."""
+
+    def __init__(self, name):
+        """Initialize the stand-in with the name of the module to import later."""
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        """Import the module if needed and return the requested attribute."""
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attribute)
@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from database import Database
+from profiling import percentile
+
+
+def seed(db, habits, days):
+    """Fill the database with habits that have the given number of days of logged data."""
+    start = date.today() - timedelta(days=days)
+    db.insert_habits({
+        "id": None,
+        "name": f"Habit {index}",
+        "description": "Load test habit",
+        "frequency": "daily",
+        "start_date": str(start),
+        "end_date": str(date.today()),
+        "status": {str(start + timedelta(days=day)): True for day in range(days) if random.random() < 0.6},
+    } for index in range(habits))
+
+
+def worker(action, stop, latencies, errors):
+    """Call action until stop is set, recording the latency of every call."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            action()
+        except Exception as error:
+            errors.append(error)
+        latencies.append(time.perf_counter() - started)
+
+
+def main():
+    """Run reader and writer threads against one concurrent Database and report throughput and latency."""
+    parser = argparse.ArgumentParser(description="Load test the habits database with concurrent readers and writers.")
+    parser.add_argument("--readers", type=int, default=8, help="Number of reader threads (default: 8)")
+    parser.add_argument("--writers", type=int, default=2, help="Number of writer threads (default: 2)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of the test (default: 5)")
+    parser.add_argument("--habits", type=int, default=200, help="Number of habits to seed (default: 200)")
+    parser.add_argument("--days", type=int, default=365, help="Days of history per habit (default: 365)")
+    parser.add_argument("--pool-size", type=int, default=4, help="Read connections in the pool (default: 4)")
+    parser.add_argument("--db", help="Database file to use, a temporary file by default")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "loadtest.db")
+    db = Database(path, concurrent=True, pool_size=args.pool_size)
+    db.connect()
+    db.create_table()
+    if not db.get_latest_entry_id():
+        seed(db, args.habits, args.days)
+    habit_ids = list(range(1, db.get_latest_entry_id() + 1))
+
+    def read():
+        db.fetch_habit(random.choice(habit_ids))
+
+    def write():
+        day = date.today() - timedelta(days=random.randrange(args.days))
+        db.complete_habit(random.choice(habit_ids), {str(day): True})
+
+    stop = threading.Event()
+    results = {"read": [], "write": []}
+    errors = []
+    threads = [threading.Thread(target=worker, args=(read, stop, results["read"], errors)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=(write, stop, results["write"], errors)) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db.close()
+
+    print(f"\n{args.readers} reader(s), {args.writers} writer(s), {args.seconds}s against {path}\n")
+    for kind, latencies in results.items():
+        if latencies:
+            print(f"{kind:>5}: {len(latencies) / args.seconds:10.0f} ops/s"
+                  f"  p50 {statistics.median(latencies) * 1000:7.2f} ms"
+                  f"  p99 {percentile(sorted(latencies), 0.99) * 1000:7.2f} ms")
+    if errors:
+        print(f"\n🚫 {len(errors)} call(s) failed, first error: {errors[0]!r}")
+
+
+if __name__ == "__main__":
+    main()
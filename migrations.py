@@ -0,0 +1,99 @@
+from datetime import datetime
+
+# Versioned migrations. Each one is recorded in the schema_migrations table; a data migration
+# rewrites the habits in chunks of IDs, committing each chunk together with the last ID it covered,
+# so the write lock is only held for one chunk at a time and an interrupted run resumes where it
+# stopped. Add new migrations to the end of the list with the next version number.
+
+default_chunk_size = 5000  # Habit IDs rewritten per transaction
+
+
+class Migration:
+    """A numbered migration: an optional schema step followed by an optional data step run in chunks."""
+
+    def __init__(self, version, name, migrate_chunk=None, prepare=None):
+        """
+        Initialize the migration.
+
+        Args:
+            version (int): The position of the migration; versions are applied in ascending order.
+            name (str): A short description stored with the version.
+            migrate_chunk (callable): Called as migrate_chunk(db, (first_id, last_id)) inside the
+            transaction of each chunk; it must be safe to run again on a chunk that was rolled back.
+            prepare (callable): Called as prepare(db) in one transaction before the first chunk,
+            e.g. to add a column or an index. It must be idempotent, since an interrupted migration
+            runs it again.
+        """
+        self.version = version
+        self.name = name
+        self.migrate_chunk = migrate_chunk
+        self.prepare = prepare
+
+
+migrations = [
+    Migration(1, "status_json", migrate_chunk=lambda db, id_range: db.migrate_status_json(id_range)),
+]
+
+
+def create_table(cursor):
+    """Create the schema_migrations table, taking over the flag older versions kept in the meta table."""
+    cursor.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        last_id INTEGER,
+        completed_at TEXT
+    )""")
+    sql = """INSERT OR IGNORE INTO schema_migrations (version, name, completed_at)
+             SELECT 1, 'status_json', datetime('now') FROM meta WHERE key = 'status_json_migrated'"""
+    cursor.execute(sql)
+    cursor.execute("DELETE FROM meta WHERE key = 'status_json_migrated'")
+
+
+def pending(db):
+    """Return the migrations that are not completed yet, in version order."""
+    with db.reader() as cursor:
+        completed = {version for (version,) in
+                     cursor.execute("SELECT version FROM schema_migrations WHERE completed_at IS NOT NULL")}
+    return [migration for migration in sorted(migrations, key=lambda migration: migration.version)
+            if migration.version not in completed]
+
+
+def run(db, chunk_size=default_chunk_size, progress=None):
+    """
+    Apply the pending migrations, resuming a data migration after the last chunk it committed.
+
+    Args:
+        db (Database): The connected database, with its tables created.
+        chunk_size (int): The number of habit IDs rewritten per transaction.
+        progress (callable): Called as progress(migration, done, total) after each chunk, with
+        the number of IDs covered so far and in total.
+
+    Returns:
+        list: The migrations that were completed.
+    """
+    applied = []
+    for migration in pending(db):
+        with db.writer() as cursor:
+            sql = "INSERT OR IGNORE INTO schema_migrations (version, name) VALUES (?, ?)"
+            cursor.execute(sql, (migration.version, migration.name))
+            last_done = cursor.execute("SELECT last_id FROM schema_migrations WHERE version = ?",
+                                       (migration.version,)).fetchone()[0]
+            if migration.prepare:
+                migration.prepare(db)
+        first_id, last_id, _ = db.fetch_id_range()
+        if migration.migrate_chunk and first_id is not None:
+            # Habits added meanwhile are written in the current format already, so the end is fixed
+            start = first_id if last_done is None else last_done + 1
+            for chunk_start in range(start, last_id + 1, chunk_size):
+                chunk_end = min(chunk_start + chunk_size - 1, last_id)
+                with db.writer() as cursor:
+                    migration.migrate_chunk(db, (chunk_start, chunk_end))
+                    cursor.execute("UPDATE schema_migrations SET last_id = ? WHERE version = ?",
+                                   (chunk_end, migration.version))
+                if progress:
+                    progress(migration, chunk_end - first_id + 1, last_id - first_id + 1)
+        with db.writer() as cursor:
+            cursor.execute("UPDATE schema_migrations SET completed_at = ? WHERE version = ?",
+                           (datetime.now().isoformat(timespec="seconds"), migration.version))
+        applied.append(migration)
+    return applied
@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from analytics import Statistics
+from database import Database
+
+# The per-habit statistics are independent, so very large habit sets are split into ID ranges
+# that worker processes compute side by side. Each worker opens the database file read-only and
+# returns only its running totals, which are a few numbers however many habits it covered.
+
+min_parallel_habits = 20000  # Below this, starting processes costs more than it saves
+shards_per_worker = 4  # More shards than workers evens out ranges with uneven habit counts
+
+
+def shard_ranges(first_id, last_id, shards):
+    """Split the IDs from first_id to last_id into at most shards contiguous (first, last) ranges."""
+    size = -(-(last_id - first_id + 1) // shards)  # Ceiling division
+    return [(start, min(start + size - 1, last_id)) for start in range(first_id, last_id + 1, size)]
+
+
+def calculate_shard(db_name, id_range):
+    """Compute the running totals of the habits in one ID range (None: every habit); runs in a worker process."""
+    db = Database(db_name, read_only=True)
+    db.connect()
+    try:
+        stats = Statistics()
+        totals = stats.new_totals()
+        for habit in db.iter_habit_periods(id_range=id_range):
+            stats.add_to_totals(totals, habit, stats.calculate_habit(habit))
+        return totals
+    finally:
+        db.close()
+
+
+def calculate_parallel(db, workers=None, min_habits=min_parallel_habits):
+    """
+    Calculate the aggregate statistics of every habit, in worker processes for large habit sets.
+
+    Args:
+        db (Database): The connected database; its file is reopened read-only by every worker.
+        workers (int): The number of worker processes (default: the number of CPUs).
+        min_habits (int): Compute serially, in this process, when there are fewer habits.
+
+    Returns:
+        Statistics: The statistics with the aggregate totals set, as after calculate_stream().
+    """
+    workers = workers or os.cpu_count() or 1
+    first_id, last_id, count = db.fetch_id_range()
+    if workers == 1 or count < max(min_habits, 1) or db.db_name == ":memory:":
+        stats = Statistics()
+        stats.calculate_stream(db.iter_habit_periods())
+        return stats
+    ranges = shard_ranges(first_id, last_id, workers * shards_per_worker)
+    return calculate_shards([db], [(db.db_name, id_range) for id_range in ranges], workers)
+
+
+def calculate_shards(databases, shards, workers):
+    """
+    Calculate the aggregate statistics of several shards with calculate_shard and merge their totals.
+
+    Args:
+        databases (iterable): The connected databases the shards are read from; they are committed first.
+        shards (list): The (db_name, id_range) arguments of calculate_shard for every shard.
+        workers (int): The number of worker processes; 1 (or a single shard) computes in this process.
+
+    Returns:
+        Statistics: The statistics with the aggregate totals set, as after calculate_stream().
+    """
+    for db in databases:
+        db.conn.commit()  # Workers only see committed data
+    stats = Statistics()
+    totals = stats.new_totals()
+    if workers == 1 or len(shards) < 2:
+        for db_name, id_range in shards:
+            stats.merge_totals(totals, calculate_shard(db_name, id_range))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for shard_totals in executor.map(calculate_shard, *zip(*shards)):
+                stats.merge_totals(totals, shard_totals)
+    stats.calculate_stream(())  # Reset the per-habit views
+    stats.set_totals(totals)
+    return stats
@@ -0,0 +1,104 @@
+from calendar import monthrange
+from datetime import date
+from functools import lru_cache
+
+# Dates are handled as integer day ordinals (date.toordinal()); YYYY-MM-DD strings are parsed
+# and formatted through the caches below, so every distinct date is converted only once.
+
+
+class DateStrings(dict):
+    """A day ordinal -> YYYY-MM-DD string cache that fills itself on lookup."""
+
+    def __missing__(self, ordinal):
+        date_str = self[ordinal] = date.fromordinal(ordinal).isoformat()
+        return date_str
+
+
+date_strings = DateStrings()
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str):
+    """Convert a YYYY-MM-DD string to a day ordinal."""
+    return date.fromisoformat(date_str).toordinal()
+
+
+def to_ordinal(value):
+    """Convert a YYYY-MM-DD string, a date or a datetime to a day ordinal."""
+    if isinstance(value, str):
+        return parse_date(value)
+    return value.toordinal()
+
+
+def format_date(ordinal):
+    """Convert a day ordinal to a YYYY-MM-DD string."""
+    return date_strings[ordinal]
+
+
+def today_ordinal():
+    """Return the day ordinal of today."""
+    return date.today().toordinal()
+
+
+def days_between(start_date, end_date):
+    """Count the days from start_date to end_date, both included."""
+    return to_ordinal(end_date) - to_ordinal(start_date) + 1
+
+
+def week_index(ordinal):
+    """Return the index of the Monday-based week of a day ordinal."""
+    return (ordinal - 1) // 7  # Ordinal 1 is a Monday
+
+
+def week_bounds(ordinal):
+    """Return the first (Monday) and last (Sunday) day ordinals of the week of a day ordinal."""
+    start = ordinal - (ordinal - 1) % 7
+    return start, start + 6
+
+
+@lru_cache(maxsize=4096)
+def month_bounds(ordinal):
+    """Return the first and last day ordinals of the calendar month of a day ordinal."""
+    day = date.fromordinal(ordinal)
+    start = ordinal - day.day + 1
+    return start, start + monthrange(day.year, day.month)[1] - 1
+
+
+def month_index(date_str):
+    """Return the index (year * 12 + month - 1) of the calendar month of a YYYY-MM-DD string."""
+    return int(date_str[:4]) * 12 + int(date_str[5:7]) - 1
+
+
+def add_months(ordinal, months):
+    """Move a day ordinal by a number of months, clamping the day to the length of the target month."""
+    day = date.fromordinal(ordinal)
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    return date(year, month, min(day.day, monthrange(year, month)[1])).toordinal()
+
+
+def get_bucket(date_str, frequency):
+    """Map a YYYY-MM-DD date to the index of its day, Monday-based week or calendar month."""
+    if frequency == "monthly":
+        return month_index(date_str)
+    ordinal = parse_date(date_str)
+    if frequency == "weekly":
+        return week_index(ordinal)
+    return ordinal
+
+
+def period_start(date_str, frequency):
+    """Return the YYYY-MM-DD first day of the day, week or month a YYYY-MM-DD date falls in."""
+    if frequency == "monthly":
+        return date_str[:8] + "01"
+    return format_date(period_bounds(date_str, frequency)[0])
+
+
+def period_bounds(date_str, frequency):
+    """Return the first and last day ordinals of the day, week or month a YYYY-MM-DD date falls in."""
+    ordinal = to_ordinal(date_str)
+    if frequency == "weekly":
+        return week_bounds(ordinal)
+    if frequency == "monthly":
+        return month_bounds(ordinal)
+    return ordinal, ordinal
@@ -0,0 +1,213 @@
+import atexit
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from tracing import query_shape
+
+# Opt-in instrumentation: enable() wraps the methods of Database, Statistics and CLI at runtime.
+# Nothing is patched unless it is called (app.py --profile or HABITS_PROFILE=1), so the app pays
+# nothing when profiling is off.
+
+class Profiler:
+    """Collect per-method timings, rows returned, SQL statements and status bytes decoded."""
+
+    def __init__(self):
+        self.timings = defaultdict(list)  # "Class.method" -> seconds per call
+        self.rows = Counter()  # "Class.method" -> rows returned
+        self.statements = defaultdict(Counter)  # "Class.method" -> SQL text -> executions
+        self.decoded_bytes = Counter()  # "Class.method" -> bytes of JSON or bitmap status decoded
+        self.local = threading.local()  # The Database method running on this thread, if any
+
+    def record(self, name, seconds, rows=None):
+        """Record one call of a method."""
+        self.timings[name].append(seconds)
+        if rows is not None:
+            self.rows[name] += rows
+
+    def trace_sql(self, sql):
+        """sqlite3 trace callback: attribute a statement to the running Database method."""
+        name = getattr(self.local, "database_call", None)
+        if name:
+            self.statements[name][query_shape(" ".join(sql.split()))] += 1
+
+    def record_decoded(self, size):
+        """Attribute decoded status bytes to the running Database method."""
+        self.decoded_bytes[getattr(self.local, "database_call", None) or "other"] += size
+
+    def report(self):
+        """Return the collected data as a JSON-serializable dictionary."""
+        report = {}
+        for name, timings in sorted(self.timings.items()):
+            ordered = sorted(timings)
+            report[name] = {
+                "calls": len(ordered),
+                "total_ms": sum(ordered) * 1000,
+                "p50_ms": percentile(ordered, 0.50) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+            }
+            if name in self.rows:
+                report[name]["rows"] = self.rows[name]
+            if name in self.decoded_bytes:
+                report[name]["decoded_bytes"] = self.decoded_bytes[name]
+            if name in self.statements:
+                report[name]["sql"] = dict(self.statements[name].most_common())
+        return report
+
+    def print_report(self, file=sys.stderr):
+        """Print a table of the calls, slowest total first, followed by the SQL per Database method."""
+        report = self.report()
+        print(f"\n{'method':<45} {'calls':>7} {'total ms':>10} {'p50 ms':>9} {'p95 ms':>9} {'rows':>8} {'decoded':>10}", file=file)
+        for name, entry in sorted(report.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+            print(f"{name:<45} {entry['calls']:>7} {entry['total_ms']:>10.2f} {entry['p50_ms']:>9.3f} {entry['p95_ms']:>9.3f}"
+                  f" {entry.get('rows', ''):>8} {entry.get('decoded_bytes', ''):>10}", file=file)
+        for name, entry in sorted(report.items()):
+            for sql, count in entry.get("sql", {}).items():
+                print(f"  {name}: {count} x {sql[:100]}", file=file)
+
+
+def percentile(ordered, fraction):
+    """Return the value below which the given fraction of the sorted values fall."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def count_rows(result):
+    """Count the rows a Database method returned: the length of a list, or one for a single record."""
+    if isinstance(result, list):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def timed_method(profiler, name, method, database=False):
+    """Wrap a method so every call is timed; generator methods are timed until they are exhausted."""
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            outer = database and getattr(profiler.local, "database_call", None) is None
+            if outer:
+                profiler.local.database_call = name
+            started = time.perf_counter()
+            rows = 0
+            try:
+                for item in method(*args, **kwargs):
+                    rows += 1
+                    yield item
+            finally:
+                if outer:
+                    profiler.local.database_call = None
+                profiler.record(name, time.perf_counter() - started, rows if database else None)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        outer = database and getattr(profiler.local, "database_call", None) is None
+        if outer:
+            profiler.local.database_call = name  # Nested Database calls report to the outermost one
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            if outer:
+                profiler.local.database_call = None
+        profiler.record(name, elapsed, count_rows(result) if database else None)
+        return result
+    return wrapper
+
+
+def instrument(profiler, cls, database=False):
+    """Replace the public methods of a class with timed wrappers."""
+    for attribute, method in list(vars(cls).items()):
+        if attribute.startswith("__") or not inspect.isfunction(method):
+            continue
+        if database and attribute in ("writer", "reader", "transaction", "bulk_load"):
+            continue  # Context managers only group the calls made inside them
+        setattr(cls, attribute, timed_method(profiler, f"{cls.__name__}.{attribute}", method, database))
+
+
+def trace_connections(profiler, database_cls):
+    """Install the SQL trace callback on every connection a Database opens, next to its --trace tracer."""
+    connect = database_cls.connect
+    open_connection = database_cls.open_connection
+
+    def trace_callback(db):
+        # A connection has one trace callback, so the tracer of Database(trace=True) is chained
+        if db.tracer is None:
+            return profiler.trace_sql
+        tracer = db.tracer
+
+        def trace_both(sql):
+            tracer(sql)
+            profiler.trace_sql(sql)
+        return trace_both
+
+    @functools.wraps(connect)
+    def traced_connect(self, *args, **kwargs):
+        result = connect(self, *args, **kwargs)
+        self.conn.set_trace_callback(trace_callback(self))
+        return result
+
+    @functools.wraps(open_connection)
+    def traced_open_connection(self, *args, **kwargs):
+        conn = open_connection(self, *args, **kwargs)
+        conn.set_trace_callback(trace_callback(self))
+        return conn
+
+    database_cls.connect = traced_connect
+    database_cls.open_connection = traced_open_connection
+
+
+def count_decoded(profiler, modules):
+    """Count the bytes passed to decode_status in the modules that imported it."""
+    import codec
+
+    decode_status = codec.decode_status
+
+    @functools.wraps(decode_status)
+    def counted_decode_status(value):
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            profiler.record_decoded(len(value))
+        return decode_status(value)
+
+    for module in (codec,) + tuple(modules):
+        module.decode_status = counted_decode_status
+
+
+def enable(output=None):
+    """
+    Instrument Database, Statistics and CLI and report when the process exits.
+
+    Args:
+        output (str): The path of a JSON file to write the report to; None prints it to stderr.
+
+    Returns:
+        Profiler: The profiler collecting the data.
+    """
+    import analytics
+    import cli
+    import database
+    import habit
+
+    profiler = Profiler()
+    instrument(profiler, database.Database, database=True)
+    trace_connections(profiler, database.Database)
+    instrument(profiler, analytics.Statistics)
+    instrument(profiler, cli.CLI)
+    count_decoded(profiler, (database, habit))
+
+    def report():
+        if output is None:
+            profiler.print_report()
+        else:
+            with open(output, "w") as file:
+                json.dump(profiler.report(), file, indent=2)
+            print(f"✔ Profile written to {output}", file=sys.stderr)
+
+    atexit.register(report)
+    return profiler
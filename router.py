@@ -0,0 +1,81 @@
+import os
+import re
+import zlib
+from database import Database
+
+# Multi-tenant storage: every tenant (user) keeps a database file of its own, so Database and the
+# schema stay single-user. The files are spread over N shard directories, which may sit on
+# different disks or mounts, by a stable hash of the tenant key.
+
+tenant_key = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.@-]{0,127}")  # Keys become file names
+
+
+class ShardRouter:
+    """Map tenant keys to database files in a fixed list of shard directories."""
+
+    def __init__(self, shard_dirs, trace=False):
+        """
+        Initialize the router over the given shard directories, creating any that are missing.
+
+        Args:
+            shard_dirs (list): The shard directories. The order must never change once tenants are
+            stored, because a tenant's shard is its key hash modulo the number of shards.
+            trace (bool): Trace the SQL statements of the databases opened (see Database).
+        """
+        if not shard_dirs:
+            raise ValueError("At least one shard directory is required")
+        self.shard_dirs = list(shard_dirs)
+        self.trace = trace
+        self.databases = {}  # tenant key -> connected Database, opened on first use
+        for shard_dir in self.shard_dirs:
+            os.makedirs(shard_dir, exist_ok=True)
+
+    def shard_for(self, tenant):
+        """Return the index of the shard directory of a tenant."""
+        if not tenant_key.fullmatch(tenant):
+            raise ValueError(f"Invalid tenant key: {tenant!r}")
+        return zlib.crc32(tenant.encode()) % len(self.shard_dirs)  # Stable across processes, unlike hash()
+
+    def path_for(self, tenant):
+        """Return the path of the database file of a tenant."""
+        return os.path.join(self.shard_dirs[self.shard_for(tenant)], f"{tenant}.db")
+
+    def database(self, tenant):
+        """Return the connected database of a tenant, creating its file and tables on first use."""
+        db = self.databases.get(tenant)
+        if db is None:
+            db = Database(self.path_for(tenant), trace=self.trace)
+            db.connect()
+            db.create_table()
+            self.databases[tenant] = db
+        return db
+
+    def tenants(self):
+        """Yield the keys of the tenants stored in every shard, shard by shard."""
+        for index, shard_dir in enumerate(self.shard_dirs):
+            for file_name in sorted(os.listdir(shard_dir)):
+                tenant, extension = os.path.splitext(file_name)
+                if extension == ".db" and tenant_key.fullmatch(tenant) and self.shard_for(tenant) == index:
+                    yield tenant
+
+    def calculate_totals(self, workers=None):
+        """
+        Calculate the aggregate statistics over every tenant, one tenant database per task.
+
+        Args:
+            workers (int): The number of worker processes (default: the number of CPUs; 1 computes
+            in this process).
+
+        Returns:
+            Statistics: The statistics with the aggregate totals set, as after calculate_stream().
+        """
+        import parallel
+
+        shards = [(self.path_for(tenant), None) for tenant in self.tenants()]
+        return parallel.calculate_shards(self.databases.values(), shards, workers or os.cpu_count() or 1)
+
+    def close(self):
+        """Close the databases opened so far."""
+        for db in self.databases.values():
+            db.close()
+        self.databases.clear()
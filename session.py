@@ -0,0 +1,163 @@
+import sys
+import threading
+import time
+
+# Write-behind for interactive use: a Session stands in for a Database, stages the writes of the
+# menu actions and applies them later in one transaction, so a slow disk costs one commit per
+# batch instead of one per keypress.
+
+flush_interval = 5.0  # Seconds a staged write may wait before it is flushed
+max_pending = 50  # Staged writes that trigger a flush at once
+# Reads of one habit, by its ID as the first argument; they only flush when that habit has staged writes
+habit_reads = ("fetch_habit", "fetch_habit_meta", "fetch_date_range", "fetch_status",
+               "fetch_completions_between", "has_completion_between")
+# Reads of habit columns only (IDs, names, ...); they only flush when an insert, update or delete is staged
+column_reads = ("fetch_habit_summaries", "fetch_id_range", "get_latest_entry_id")
+column_writes = ("insert_habit", "update_habit", "delete_habit")  # Staged writes that change the habit columns
+passthrough = ("connect", "create_table", "start_action", "cache_info")  # Never need the staged writes
+
+
+class Session:
+    """
+    A unit of work in front of a Database that stages writes and flushes them in one transaction.
+
+    The writes are flushed on a timer, when max_pending of them are staged, before a read that
+    depends on them, on flush() and on close(). A flush applies the writes in the order they were
+    staged inside a single transaction, so a crash loses at most the writes of the last flush
+    interval and never leaves part of a batch behind. A flush that fails, e.g. with "database is
+    locked", leaves the whole batch staged for the next one. The timer flushes from a background
+    thread, which needs a Database opened with concurrent=True; otherwise an overdue batch is
+    flushed by the next call instead.
+    """
+
+    def __init__(self, db, flush_interval=flush_interval, max_pending=max_pending):
+        """
+        Initialize the session for a Database.
+
+        Args:
+            db (Database): The database the staged writes are applied to.
+            flush_interval (float): Seconds a staged write may wait before it is flushed.
+            max_pending (int): The number of staged writes that triggers a flush.
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = []  # (Database method name, arguments) in the order they were staged
+        self.pending_ids = set()  # IDs (as strings, the menus pass both) of the habits with staged writes; None for a new habit
+        self.columns_pending = False  # Whether a staged write changes the habit columns, not only logged data
+        self.staged_at = None  # time.monotonic() of the oldest staged write
+        self.lock = threading.RLock()
+        self.timer = None
+        self.flushes = 0
+
+    def stage(self, name, habit_id, *args):
+        """Stage a call of a Database write method and flush if the batch is full or overdue."""
+        with self.lock:
+            self.flush_if_overdue()
+            self.pending.append((name, args))
+            self.pending_ids.add(None if habit_id is None else str(habit_id))
+            self.columns_pending = self.columns_pending or name in column_writes
+            if self.staged_at is None:
+                self.staged_at = time.monotonic()
+                self.start_timer()
+            if len(self.pending) >= self.max_pending:
+                self.flush()
+
+    def start_timer(self):
+        """Schedule a flush from a background thread in flush_interval seconds, in concurrent mode."""
+        if self.db.concurrent:
+            self.timer = threading.Timer(self.flush_interval, self.flush_in_background)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def insert_habit(self, habit_dict):
+        """Stage the insertion of a habit record."""
+        self.stage("insert_habit", habit_dict.get("id"), dict(habit_dict))
+
+    def update_habit(self, habit_id, habit_dict):
+        """Stage an update of the attributes of a habit record."""
+        self.stage("update_habit", habit_id, habit_id, dict(habit_dict))
+
+    def complete_habit(self, id, log_data):
+        """Stage logged data of a habit."""
+        self.stage("complete_habit", id, id, dict(log_data))
+
+    def clear_habit_status(self, habit_id):
+        """Stage clearing the logged data of a habit."""
+        self.stage("clear_habit_status", habit_id, habit_id)
+
+    def delete_habit(self, id):
+        """Stage the deletion of a habit record."""
+        self.stage("delete_habit", id, id)
+
+    def flush(self):
+        """
+        Apply the staged writes in one transaction and return how many there were.
+
+        If one write fails, the whole batch is rolled back and stays staged, and the error is raised.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            pending = self.pending
+            if not pending:
+                return 0
+            try:
+                with self.db.transaction():
+                    for name, args in pending:
+                        getattr(self.db, name)(*args)
+            except BaseException:
+                self.start_timer()  # Try again later, like a newly staged batch
+                raise
+            self.pending = []
+            self.pending_ids = set()
+            self.columns_pending = False
+            self.staged_at = None
+            self.flushes += 1
+            return len(pending)
+
+    def flush_in_background(self):
+        """Flush from the timer thread, reporting an error instead of raising it in the middle of the menu."""
+        try:
+            self.flush()
+        except Exception as error:
+            print(f"\n⚠ Could not save {self.pending_count()} staged change(s), they are kept for the next save: {error}",
+                  file=sys.stderr)
+
+    def flush_if_overdue(self):
+        """Flush when the oldest staged write has waited longer than flush_interval."""
+        with self.lock:
+            if self.staged_at is not None and time.monotonic() - self.staged_at >= self.flush_interval:
+                self.flush()
+
+    def pending_count(self):
+        """Return the number of staged writes."""
+        with self.lock:
+            return len(self.pending)
+
+    def close(self):
+        """Flush the staged writes and close the database."""
+        try:
+            self.flush()
+        finally:
+            self.db.close()
+
+    def __getattr__(self, name):
+        """Delegate every other attribute to the database, flushing the staged writes a read depends on."""
+        if name == "db":
+            raise AttributeError(name)  # Not set yet, e.g. while unpickling
+        attribute = getattr(self.db, name)
+        if name in passthrough or not callable(attribute):
+            return attribute
+
+        def read(*args, **kwargs):
+            with self.lock:
+                if name in habit_reads and args and None not in self.pending_ids and str(args[0]) not in self.pending_ids:
+                    self.flush_if_overdue()  # Other habits' staged writes can keep waiting
+                elif name in column_reads and not self.columns_pending:
+                    self.flush_if_overdue()  # Staged check-ins and clears do not change the columns
+                elif self.pending:
+                    self.flush()
+            return attribute(*args, **kwargs)
+        return read
@@ -0,0 +1,271 @@
+from datetime import date, timedelta
+from functools import partial
+import random
+import pytest
+from analytics import Statistics
+from database import Database
+
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def random_days(rng, start_date, today, before=0):
+    """Return up to 80 random completed days from before days ahead of start_date to today."""
+    return {str(start_date + timedelta(days=rng.randint(-before, (today - start_date).days))): True
+            for _ in range(rng.randint(0, 80))}
+
+
+def day_runs(rng, start_date, today):
+    """Return runs of consecutive days, weeks or months with gaps, some of them outside start_date to today."""
+    status = {}
+    day = start_date - timedelta(days=20)
+    while day <= today + timedelta(days=20):
+        if rng.random() < 0.3:
+            day += timedelta(days=rng.randint(1, 40))
+        status[str(day)] = True
+        day += timedelta(days=rng.choice([1, 1, 1, 7, 30]))
+    return status
+
+
+def random_habits(seed, ids, max_age=300, logged=random_days):
+    """Return habits with the given IDs, random frequencies and start dates up to max_age days ago, and logged(rng, start_date, today) data."""
+    rng = random.Random(seed)
+    today = date.today()
+    habits = []
+    for habit_id in ids:
+        start_date = today - timedelta(days=rng.randint(0, max_age))
+        habits.append({
+            "id": habit_id,
+            "name": f"Habit {habit_id}",
+            "description": "",
+            "frequency": rng.choice(["daily", "weekly", "monthly"]),
+            "start_date": str(start_date),
+            "end_date": str(today),
+            "status": logged(rng, start_date, today),
+        })
+    return habits
+
+
+@pytest.fixture(params=["rows", "bitmap"])
+def status_format(request):
+    return request.param
+
+
+@pytest.fixture
+def make_db(tmp_path, status_format):
+    """Return a function that creates a database in the status format of the test, filled with the given habits."""
+    databases = []
+
+    def make(habits):
+        db = Database(str(tmp_path / "habits.db"))
+        db.connect()
+        db.create_table()
+        db.convert_status_format(status_format)
+        for habit in habits:
+            db.insert_habit(habit)
+        databases.append(db)
+        return db
+
+    yield make
+    for db in databases:
+        db.close()
+
+
+class TestStatistics:
+    @pytest.fixture
+    def habits(self):
+        return [
+            {
+                "id": 1,
+                "name": "Exercise",
+                "description": "Daily workout routine",
+                "frequency": "daily",
+                "start_date": days_ago(9),
+                "end_date": days_ago(0),
+                "status": {days_ago(5): True, days_ago(4): True, days_ago(3): True, days_ago(1): True},
+            },
+            {
+                "id": 2,
+                "name": "Read",
+                "description": "Read a book",
+                "frequency": "daily",
+                "start_date": days_ago(9),
+                "end_date": days_ago(0),
+                "status": {days_ago(2): True},
+            },
+        ]
+
+    def test_calculate_indexes_results_by_id(self, habits):
+        stats = Statistics()
+        stats.calculate(habits)
+
+        assert stats.results[1]["completions"] == 4
+        assert stats.results[1]["total_days"] == 10
+        assert stats.get_streak_with_id(habits, "1") == "3 day(s)"
+        assert stats.get_streak_with_id(habits, 2.0) == "1 day(s)"
+        assert stats.get_streak_with_id(habits, 3) is None
+        assert stats.total_completions == 5
+
+    def test_calculate_stream_matches_calculate(self, habits):
+        stats = Statistics()
+        stats.calculate(habits)
+        stream_stats = Statistics()
+        stream_stats.calculate_stream(iter(habits))
+
+        for name in ("total_habits", "total_completions", "average_rate", "average_frequency",
+                     "longest_streak", "current_streak"):
+            assert getattr(stream_stats, name) == getattr(stats, name)
+        assert stream_stats.results == {}
+
+    def test_ranked_streaks(self, habits):
+        stats = Statistics()
+        stats.calculate(list(reversed(habits)))
+
+        assert [item["Name"] for item in stats.ranked_streaks()] == ["Exercise", "Read"]
+
+    def test_weekly_streak_buckets_by_iso_week(self):
+        today = date.today()
+        monday = today - timedelta(days=today.weekday())
+        status = {
+            # One check-in on different weekdays of four consecutive weeks, the last one this week
+            str(monday - timedelta(weeks=3) + timedelta(days=6)): True,
+            str(monday - timedelta(weeks=2)): True,
+            str(monday - timedelta(weeks=1) + timedelta(days=3)): True,
+            str(monday): True,
+            str(monday - timedelta(weeks=6)): True,
+        }
+        habit = {"frequency": "weekly", "start_date": str(monday - timedelta(weeks=8)), "status": status}
+
+        assert Statistics().calculate_streaks(habit) == (4, 4)
+
+    def test_monthly_current_streak_allows_unlogged_current_month(self):
+        today = date.today()
+        last_month = (today.replace(day=1) - timedelta(days=1)).replace(day=15)
+        month_before = (last_month.replace(day=1) - timedelta(days=1)).replace(day=2)
+        habit = {
+            "frequency": "monthly",
+            "start_date": "2000-01-01",
+            "status": {str(last_month): True, str(month_before): True, "2000-02-01": False},
+        }
+
+        assert Statistics().calculate_streaks(habit) == (2, 2)
+
+    def test_vectorized_engine_matches_python_engine(self):
+        pytest.importorskip("numpy")
+        rng = random.Random(4)
+        today = date.today()
+        habits = []
+        for habit_id in range(200):
+            start_date = today - timedelta(days=rng.randint(0, 400))
+            status = {str(start_date + timedelta(days=rng.randint(-30, 430))): rng.random() < 0.8
+                      for _ in range(rng.randint(0, 150))}
+            habits.append({
+                "id": habit_id,
+                "name": f"Habit {habit_id}",
+                "frequency": rng.choice(["daily", "weekly", "monthly"]),
+                "start_date": str(start_date),
+                "end_date": str(start_date + timedelta(days=400)),
+                "status": status,
+            })
+
+        python_stats = Statistics()
+        python_stats.calculate(habits)
+        vectorized_stats = Statistics()
+        vectorized_stats.calculate(habits, vectorized=True)
+
+        assert vectorized_stats.results == python_stats.results
+        assert vectorized_stats.longest_streak == python_stats.longest_streak
+        assert vectorized_stats.current_streak == python_stats.current_streak
+        assert vectorized_stats.average_rate == python_stats.average_rate
+
+    def test_period_rollups_match_raw_history(self, make_db):
+        db = make_db(random_habits(7, range(1, 61)))
+
+        raw_stats = Statistics()
+        raw_stats.calculate(db.fetch_all_habits())
+        period_stats = Statistics()
+        period_stats.calculate(db.fetch_habit_periods())
+
+        assert period_stats.results == raw_stats.results
+        assert period_stats.habits_streaks == raw_stats.habits_streaks
+        assert period_stats.average_rate == raw_stats.average_rate
+
+    def test_vectorized_engine_reads_periods_and_the_database(self, make_db):
+        pytest.importorskip("numpy")
+        from database import habit_columns
+
+        db = make_db(random_habits(5, range(1, 61), logged=partial(random_days, before=10)))
+
+        python_stats = Statistics()
+        python_stats.calculate(db.fetch_all_habits())
+        period_stats = Statistics()
+        period_stats.calculate(db.fetch_habit_periods(), vectorized=True)
+        database_stats = Statistics()
+        database_stats.calculate(db.fetch_habit_summaries(habit_columns), vectorized=True, db=db)
+        weekly_stats = Statistics()
+        weekly_stats.calculate(db.fetch_habit_summaries(habit_columns, frequency="weekly"), vectorized=True, db=db)
+
+        weekly = {habit_id: result for habit_id, result in python_stats.results.items()
+                  if habit_id in weekly_stats.results}
+        assert period_stats.results == python_stats.results
+        assert database_stats.results == python_stats.results
+        assert weekly_stats.results == weekly
+        assert weekly
+
+    def test_sql_streaks_match_python_streaks(self, make_db):
+        db = make_db(random_habits(11, range(1, 151), max_age=500, logged=day_runs))
+
+        stats = Statistics()
+        python_streaks = {habit["id"]: stats.calculate_streaks(habit) for habit in db.fetch_habit_periods()}
+        raw_streaks = {habit["id"]: stats.calculate_streaks(habit) for habit in db.fetch_habits_by_frequency("daily")}
+
+        weekly_ids = [habit["id"] for habit in db.fetch_habit_summaries(frequency="weekly")]
+
+        assert db.fetch_streaks() == python_streaks
+        assert db.fetch_streaks("Daily") == raw_streaks
+        assert db.fetch_streaks("weekly") == {habit_id: python_streaks[habit_id] for habit_id in weekly_ids}
+        assert any(current for _, current in python_streaks.values())
+
+    def test_parallel_totals_match_serial_totals(self, make_db):
+        import parallel
+
+        db = make_db(random_habits(13, random.Random(13).sample(range(1, 400), 90)))  # IDs with gaps, so some shards are empty
+
+        serial_stats = Statistics()
+        serial_stats.calculate_stream(db.fetch_habit_periods())
+        parallel_stats = parallel.calculate_parallel(db, workers=2, min_habits=0)
+
+        assert parallel_stats.total_habits == serial_stats.total_habits
+        assert parallel_stats.total_completions == serial_stats.total_completions
+        assert parallel_stats.average_rate == serial_stats.average_rate
+        assert parallel_stats.average_frequency == serial_stats.average_frequency
+        assert parallel_stats.longest_streak == serial_stats.longest_streak
+        assert parallel_stats.current_streak == serial_stats.current_streak
+
+    def test_streaks_count_the_period_holding_the_start_date(self, make_db):
+        import vectorized
+
+        db = make_db({
+            "id": habit_id,
+            "name": f"Habit {habit_id}",
+            "description": "",
+            "frequency": frequency,
+            "start_date": "2023-07-05",  # A Wednesday
+            "end_date": "2023-12-31",
+            "status": dict.fromkeys(status, True),
+        } for habit_id, frequency, status in ((1, "weekly", ["2023-07-03", "2023-07-10"]),
+                                              (2, "monthly", ["2023-07-01", "2023-08-31"]),
+                                              (3, "daily", ["2023-07-04", "2023-07-05", "2023-07-06"])))
+        habits = db.fetch_all_habits()
+
+        stats = Statistics()
+        raw_streaks = {habit["id"]: stats.calculate_streaks(habit) for habit in habits}
+        period_streaks = {habit["id"]: stats.calculate_streaks(habit) for habit in db.iter_habit_periods(batch_size=1)}
+        arrays = vectorized.calculate(vectorized.CompletionMatrix.from_habits(habits))
+        vectorized_streaks = dict(zip([habit["id"] for habit in habits], arrays["streak"].tolist()))
+
+        assert {habit_id: streak for habit_id, (streak, _) in raw_streaks.items()} == {1: 2, 2: 2, 3: 2}
+        assert period_streaks == raw_streaks
+        assert db.fetch_streaks() == raw_streaks
+        assert vectorized_streaks == {1: 2, 2: 2, 3: 2}
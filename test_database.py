@@ -0,0 +1,447 @@
+import io
+import json
+import random
+import migrations
+import sqlite3
+import threading
+import pytest
+import transfer
+from codec import decode_status, encode_bitmap
+from database import Database
+from habit import Habit
+
+
+class TestDatabase:
+    @pytest.fixture
+    def db(self, tmp_path):
+        db = Database(str(tmp_path / "habits.db"))
+        db.connect()
+        db.create_table()
+        yield db
+        db.close()
+
+    def test_insert_and_fetch_habit(self, db, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-02": True, "2023-07-01": False}))
+
+        habit = db.fetch_habit(db.get_latest_entry_id())
+
+        assert habit["name"] == "Exercise"
+        assert habit["status"] == {"2023-07-02": True}  # Days that are not done are not stored
+
+    @pytest.mark.parametrize("status_format", ["rows", "bitmap"])
+    def test_fetches_return_habit_objects(self, db, status_format, make_habit):
+        db.convert_status_format(status_format)
+        db.insert_habit(Habit(None, "Exercise", "Daily workout routine", "daily", "2023-07-01", "2023-07-31",
+                              {"2023-07-01": True}).to_database_dict())
+
+        habit = db.fetch_habit(1)
+        meta = db.fetch_habit_meta(1)
+        summary, = db.fetch_habit_summaries()
+        periods, = db.fetch_habit_periods()
+
+        assert isinstance(habit, Habit) and not hasattr(habit, "__dict__")
+        assert habit == make_habit(id=1, status={"2023-07-01": True})
+        assert habit.status is not db.fetch_habit(1).status
+        assert "status" not in meta and dict(meta)["name"] == "Exercise"
+        assert list(summary) == ["id", "name"]
+        reordered, = db.fetch_habit_summaries(("name", "id", "description", "frequency", "start_date", "end_date"))
+        assert (reordered.id, reordered.name) == (1, "Exercise")
+        assert periods["periods"] == {"2023-07-01": 1}
+        assert [habit.id for habit in db.iter_habits()] == [habit.id for habit in db.fetch_all_habits()] == [1]
+
+    def test_complete_habit_upserts_single_rows(self, db, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-01": False}))
+        habit_id = db.get_latest_entry_id()
+
+        db.complete_habit(habit_id, {"2023-07-01": True})
+        db.complete_habit(habit_id, {"2023-07-03": True})
+
+        assert db.fetch_habit(habit_id)["status"] == {"2023-07-01": True, "2023-07-03": True}
+
+    @pytest.mark.parametrize("status_format", ["rows", "bitmap"])
+    def test_status_is_sparse_and_compacts(self, db, status_format, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-01": True, "2023-07-02": True}))
+        db.convert_status_format(status_format)
+        db.complete_habit(1, {"2023-07-02": False, "2023-07-03": False})
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True}
+
+        # Older versions stored a 'not done' entry for every missed day
+        if status_format == "bitmap":
+            legacy = encode_bitmap({"2023-07-01": True, "2023-07-02": False, "2023-07-03": False})
+            db.cursor.execute("UPDATE habits SET status = ?", (legacy,))
+        else:
+            db.cursor.executemany("INSERT INTO completions VALUES (1, ?, 0)", [("2023-07-02",), ("2023-07-03",)])
+
+        assert db.compact_statuses() == 2
+        assert db.compact_statuses() == 0
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True}
+
+    @pytest.mark.parametrize("status_format", ["rows", "bitmap"])
+    def test_completions_between(self, db, status_format, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-03": True, "2023-07-10": True, "2023-07-31": True}))
+        db.insert_habit(make_habit(name="Read"))
+        db.convert_status_format(status_format)
+
+        assert db.fetch_completions_between(1, "2023-07-01", "2023-07-10") == ["2023-07-03", "2023-07-10"]
+        assert db.fetch_completions_between(1, "2023-06-01", "2023-08-31") == ["2023-07-03", "2023-07-10", "2023-07-31"]
+        assert db.has_completion_between(1, "2023-07-31", "2023-07-31")
+        assert not db.has_completion_between(1, "2023-07-04", "2023-07-09")
+        assert not db.has_completion_between(2, "2023-07-01", "2023-07-31")
+        assert not db.has_completion_between(3, "2023-07-01", "2023-07-31")
+
+    def test_period_rollups_follow_writes(self, db, make_habit):
+        def rollups():
+            return db.cursor.execute("SELECT * FROM period_completions ORDER BY 1, 2, 3").fetchall()
+
+        # Dates around month and week boundaries, Sunday 2023-07-02 and Monday 2023-07-03 included
+        db.insert_habit(make_habit(frequency="weekly", status={"2023-06-30": True, "2023-07-02": True, "2023-07-03": True}))
+        db.insert_habit(make_habit(name="Read", frequency="monthly", status={"2023-07-31": True}))
+        db.complete_habit(2, {"2023-08-01": True, "2023-07-31": False})
+        db.delete_habit(2)
+        db.complete_habit(1, {"2023-07-03": False, "2023-07-09": True})
+
+        expected = [(1, "monthly", "2023-06-01", 1), (1, "monthly", "2023-07-01", 2),
+                    (1, "weekly", "2023-06-26", 2), (1, "weekly", "2023-07-03", 1)]
+        assert rollups() == expected
+        db.rebuild_rollups()
+        assert rollups() == expected
+        db.convert_status_format("bitmap")  # Rebuilt in Python from the bitmaps
+        assert rollups() == expected
+        db.complete_habit(1, {"2023-07-10": True})
+        habit, = db.fetch_habit_periods()
+        assert "status" not in habit
+        assert habit["periods"] == {"2023-06-26": 2, "2023-07-03": 1, "2023-07-10": 1}
+        db.clear_habit_status(1)
+        assert rollups() == []
+
+    def test_delete_and_clear_remove_completions(self, db, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-01": True}))
+        db.insert_habit(make_habit(name="Read", status={"2023-07-01": True}))
+
+        db.clear_habit_status(1)
+        db.delete_habit(2)
+
+        assert db.fetch_habit(1)["status"] == {}
+        assert db.fetch_habit(2) is None
+        assert db.cursor.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 0
+
+    @pytest.mark.parametrize("status_format", ["rows", "bitmap"])
+    def test_habit_cache_reads_and_invalidation(self, db, status_format, make_habit):
+        db.convert_status_format(status_format)
+        db.insert_habit(make_habit(status={"2023-07-01": True}))
+        db.insert_habit(make_habit(name="Read"))
+
+        assert db.fetch_date_range(1) == ("2023-07-01", "2023-07-31")
+        assert db.fetch_habit_meta(1)["name"] == "Exercise"
+        db.fetch_habit(1)["status"]["2023-07-09"] = True  # Changing a returned habit leaves the cache alone
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True}
+        assert db.cache_info() == {"hits": 2, "misses": 2, "size": 1, "max_size": 1024}
+
+        db.complete_habit(1, {"2023-07-02": True})
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True, "2023-07-02": True}
+        db.update_habit(1, {"name": "Run"})
+        assert db.fetch_habit_meta(1)["name"] == "Run"
+        db.clear_habit_status(1)
+        assert db.fetch_habit(1)["status"] == {}
+        db.fetch_habit(2)
+        db.delete_habit(2)
+        assert db.fetch_habit(2) is None
+
+        with pytest.raises(sqlite3.IntegrityError):
+            with db.transaction():
+                db.complete_habit(1, {"2023-07-03": True})
+                assert db.fetch_habit(1)["status"] == {"2023-07-03": True}  # Not cached inside the write
+                db.insert_habit(make_habit(id=1))
+        assert db.fetch_habit(1)["status"] == {}
+
+    def test_habit_cache_with_string_ids_and_other_writers(self, db, make_habit):
+        db.insert_habit(make_habit(name="A"))
+        db.insert_habit(make_habit(name="B"))
+        db.fetch_habit(1)
+
+        # The menus pass the IDs picked from a list as strings
+        db.complete_habit("1", {"2023-07-02": True})
+        assert db.fetch_habit(1)["status"] == {"2023-07-02": True}
+        db.update_habit("1", {"name": "Run"})
+        assert db.fetch_habit("1")["name"] == "Run"
+        db.delete_habit("1")
+        assert db.fetch_habit(1) is None
+
+        db.fetch_habit(2)
+        other = Database(db.db_name)  # e.g. a cron "app.py check" in another process
+        other.connect()
+        other.complete_habit(2, {"2023-07-05": True})
+        other.close()
+        assert db.fetch_habit(2)["status"] == {"2023-07-05": True}
+
+    def test_habit_cache_with_concurrent_readers(self, tmp_path, make_habit):
+        db = Database(str(tmp_path / "habits.db"), concurrent=True)
+        db.connect()
+        db.create_table()
+        db.insert_habits([make_habit(name=f"Habit {index}") for index in range(20)])
+
+        def read(seed):
+            rng = random.Random(seed)
+            for _ in range(2000):
+                db.fetch_habit(rng.randint(1, 20))
+
+        threads = [threading.Thread(target=read, args=(seed,)) for seed in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        info = db.cache_info()
+        assert info["size"] == 20
+        assert info["misses"] <= 20 * len(threads)  # At most one miss per habit and thread, however it interleaves
+        assert info["hits"] + info["misses"] == 2000 * len(threads)
+
+        db.update_habit(1, {"name": "Run"})  # A write through the object only drops its own rows
+        assert db.cache_info()["size"] == 19
+        other = Database(db.db_name)
+        other.connect()
+        other.update_habit(2, {"name": "Swim"})
+        other.close()
+        assert db.fetch_habit(2)["name"] == "Swim"
+        assert db.cache_info()["size"] == 1
+        db.close()
+
+    def test_habit_cache_evicts_least_recently_used(self, tmp_path, make_habit):
+        db = Database(str(tmp_path / "habits.db"), cache_size=2)
+        db.connect()
+        db.create_table()
+        db.insert_habits([make_habit(name=f"Habit {index}") for index in range(3)])
+
+        for habit_id in (1, 2, 1, 3):
+            db.fetch_habit_meta(habit_id)
+
+        assert list(db.habit_cache) == [1, 3]
+        db.close()
+
+    def test_fetch_habits_by_frequency(self, db, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-01": True}))
+        db.insert_habit(make_habit(name="Read", frequency="weekly", status={"2023-07-03": True}))
+
+        habits = db.fetch_habits_by_frequency("Weekly")
+
+        assert [habit["name"] for habit in habits] == ["Read"]
+        assert habits[0]["status"] == {"2023-07-03": True}
+
+    @pytest.mark.parametrize("status_format", ["rows", "bitmap"])
+    def test_iter_habits_streams_in_batches(self, db, status_format, make_habit):
+        db.insert_habits([make_habit(name=f"Habit {index}", frequency=["daily", "weekly"][index % 2],
+                                     status={f"2023-07-{day:02d}": day % 2 == 0 for day in range(1, index + 1)})
+                          for index in range(7)])
+        db.convert_status_format(status_format)
+
+        assert list(db.iter_habits(batch_size=2)) == db.fetch_all_habits()
+        assert list(db.iter_habits(batch_size=3, frequency="Weekly")) == db.fetch_habits_by_frequency("weekly")
+
+    def test_projections_skip_logged_data(self, db, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-01": True}))
+        db.insert_habit(make_habit(name="Read", frequency="weekly"))
+
+        assert db.fetch_habit_summaries() == [{"id": 1, "name": "Exercise"}, {"id": 2, "name": "Read"}]
+        assert db.fetch_habit_summaries(("name",), frequency="Weekly") == [{"name": "Read"}]
+        assert db.fetch_habit_meta(1) == {key: value for key, value in make_habit(id=1).items() if key != "status"}
+        assert db.fetch_habit_meta(3) is None
+        with pytest.raises(ValueError):
+            db.fetch_habit_summaries(("status",))
+
+    def test_migrates_legacy_json_status(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE habits (id INTEGER PRIMARY KEY, name TEXT, description TEXT,
+                        frequency TEXT, start_date TEXT, end_date TEXT, status TEXT)""")
+        conn.execute("INSERT INTO habits VALUES (1, 'Read', '', 'weekly', '2023-07-03', '2023-07-31', ?)",
+                     (json.dumps({"2023-07-03": True, "2023-07-10": False}),))
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        db.connect()
+        db.create_table()
+
+        assert db.fetch_habit(1)["status"] == {"2023-07-03": True}
+        assert db.cursor.execute("SELECT status FROM habits").fetchone()[0] is None
+        db.close()
+
+    def test_migrations_run_in_resumable_chunks(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE habits (id INTEGER PRIMARY KEY, name TEXT, description TEXT,
+                        frequency TEXT, start_date TEXT, end_date TEXT, status TEXT)""")
+        conn.executemany("INSERT INTO habits VALUES (?, 'Read', '', 'daily', '2023-07-01', '2023-07-31', ?)",
+                         [(habit_id, json.dumps({"2023-07-01": True})) for habit_id in range(1, 26)])
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        db.connect()
+        db.create_table(run_migrations=False)
+        assert [migration.name for migration in migrations.pending(db)] == ["status_json"]
+
+        def interrupt(migration, done, total):
+            assert (done, total) == (10, 25)
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            migrations.run(db, chunk_size=10, progress=interrupt)
+        text_statuses = "SELECT COUNT(*) FROM habits WHERE typeof(status) = 'text'"
+        assert db.cursor.execute(text_statuses).fetchone()[0] == 15  # The first chunk is committed
+
+        reported = []
+        applied = migrations.run(db, chunk_size=10, progress=lambda migration, done, total: reported.append(done))
+        assert [migration.version for migration in applied] == [1]
+        assert reported == [20, 25]
+        assert db.cursor.execute(text_statuses).fetchone()[0] == 0
+        assert db.cursor.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 25
+        assert migrations.pending(db) == []
+        db.close()
+
+    def test_migrations_take_over_legacy_flag(self, db):
+        db.cursor.execute("DELETE FROM schema_migrations")
+        db.cursor.execute("INSERT INTO meta (key, value) VALUES ('status_json_migrated', '1')")
+        db.conn.commit()
+
+        db.create_table()
+
+        assert db.cursor.execute("SELECT version, last_id FROM schema_migrations").fetchall() == [(1, None)]
+        assert db.cursor.execute("SELECT COUNT(*) FROM meta WHERE key = 'status_json_migrated'").fetchone()[0] == 0
+
+    def test_bitmap_status_format(self, db, make_habit):
+        db.insert_habit(make_habit(status={"2023-07-01": True, "2023-07-09": False}))
+        db.convert_status_format("bitmap")
+
+        db.complete_habit(1, {"2023-07-20": True})
+        db.insert_habit(make_habit(name="Read", status='{"2023-07-02": true}'))
+
+        assert db.cursor.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 0
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True, "2023-07-20": True}
+        assert db.fetch_all_habits()[1]["status"] == {"2023-07-02": True}
+
+        db.convert_status_format("rows")
+
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True, "2023-07-20": True}
+        assert db.cursor.execute("SELECT COUNT(*) FROM habits WHERE status IS NOT NULL").fetchone()[0] == 0
+
+    def test_bitmap_codec_round_trip(self):
+        status = {f"2023-07-{day:02d}": day % 3 == 0 for day in range(1, 32) if day % 5}
+
+        assert decode_status(encode_bitmap(status)) == status
+        assert decode_status(encode_bitmap({})) == {}
+
+    def test_bulk_methods(self, db, make_habit):
+        db.insert_habits([make_habit(status={"2023-07-01": True}), make_habit(name="Read"), make_habit(id=10)])
+
+        db.complete_habits({1: {"2023-07-02": True}, 2: {"2023-07-02": True}, 99: {"2023-07-02": True}})
+        db.delete_habits([10])
+
+        assert [habit["id"] for habit in db.fetch_all_habits()] == [1, 2]
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True, "2023-07-02": True}
+        assert db.cursor.execute("SELECT COUNT(*) FROM completions WHERE habit_id = 99").fetchone()[0] == 0
+
+    def test_transaction_commits_once_or_rolls_back(self, db, make_habit):
+        commits = []
+        db.conn = CommitCounter(db.conn, commits)
+
+        with db.transaction():
+            db.insert_habit(make_habit())
+            db.complete_habit(1, {"2023-07-01": True})
+        assert len(commits) == 1
+
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.delete_habit(1)
+                raise RuntimeError("interrupted")
+        assert db.fetch_habit(1)["status"] == {"2023-07-01": True}
+
+    @pytest.mark.parametrize("file_format", ["ndjson", "csv"])
+    @pytest.mark.parametrize("status_format", ["rows", "bitmap"])
+    def test_export_import_round_trip(self, db, tmp_path, file_format, status_format, make_habit):
+        db.insert_habits([make_habit(status={"2023-07-01": True, "2023-07-02": False}),
+                          make_habit(id=5, name="Read", frequency="weekly", status={"2023-07-03": True})])
+        file = io.StringIO()
+        assert transfer.export_habits(db, file, file_format) == (2, 2)
+
+        copy = Database(str(tmp_path / "copy.db"))
+        copy.connect()
+        copy.create_table()
+        copy.convert_status_format(status_format)
+        file.seek(0)
+
+        assert transfer.import_habits(copy, file, file_format, batch_size=2) == (2, 2)
+        assert copy.fetch_all_habits() == db.fetch_all_habits()
+        assert copy.cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_completions_date'").fetchone()[0] == 1
+        copy.close()
+
+    def test_trace_flags_repeats_and_scans(self, tmp_path, make_habit):
+        db = Database(str(tmp_path / "traced.db"), trace=True, cache_size=0)  # Repeats would hit the habit cache
+        db.connect()
+        db.tracer.file = io.StringIO()
+        db.create_table()
+        db.insert_habits([make_habit(name=f"Habit {index}") for index in range(12)])
+
+        db.start_action("list")
+        db.fetch_habits_by_frequency("weekly")
+        for habit_id in range(1, 11):
+            db.fetch_habit_meta(habit_id)
+        db.fetch_habit_meta(1)
+        db.cursor.execute("SELECT id FROM habits WHERE name = 'Habit 3'")
+
+        warnings = db.tracer.warnings
+        assert "repeated query in list: SELECT id, name, description, frequency, start_date, end_date FROM habits WHERE id = 1" in warnings
+        assert any(warning.startswith("N+1 pattern in list") for warning in warnings)
+        assert any(warning.startswith("full table scan") and "name = ?" in warning for warning in warnings)
+        assert not [warning for warning in warnings if "frequency = ?" in warning]  # Served by idx_habits_frequency
+        assert "[sql] SELECT id FROM habits WHERE name = 'Habit 3'" in db.tracer.file.getvalue()
+        db.close()
+
+    def test_concurrent_readers_and_writers(self, tmp_path, make_habit):
+        db = Database(str(tmp_path / "concurrent.db"), concurrent=True, pool_size=2)
+        db.connect()
+        db.create_table()
+        db.insert_habits([make_habit(name=f"Habit {index}") for index in range(4)])
+        errors = []
+
+        def write(habit_id):
+            try:
+                for day in range(1, 29):
+                    db.complete_habit(habit_id, {f"2023-07-{day:02d}": True})
+            except Exception as error:
+                errors.append(error)
+
+        def read():
+            try:
+                for _ in range(50):
+                    db.fetch_all_habits()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(habit_id,)) for habit_id in range(1, 5)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.readers_opened <= 2
+        assert all(len(habit["status"]) == 28 for habit in db.fetch_all_habits())
+        db.close()
+
+
+class CommitCounter:
+    """Wrap a connection and record its commits."""
+
+    def __init__(self, conn, commits):
+        self.conn = conn
+        self.commits = commits
+
+    def commit(self):
+        self.commits.append(True)
+        self.conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+import periods
+
+
+class TestPeriods:
+    def test_parse_and_format_round_trip(self):
+        ordinal = periods.to_ordinal("2024-02-29")
+
+        assert ordinal == date(2024, 2, 29).toordinal() == periods.to_ordinal(date(2024, 2, 29))
+        assert periods.format_date(ordinal) == "2024-02-29"
+        assert periods.days_between("2024-02-01", "2024-03-01") == 30
+
+    def test_week_and_month_bounds(self):
+        for offset in range(7):
+            day = date(2026, 10, 12) + timedelta(days=offset)  # Monday to Sunday
+            start, end = periods.period_bounds(day.isoformat(), "weekly")
+            assert (periods.format_date(start), periods.format_date(end)) == ("2026-10-12", "2026-10-18")
+            assert periods.get_bucket(day.isoformat(), "weekly") == periods.week_index(start)
+
+        start, end = periods.period_bounds("2024-02-10", "monthly")
+        assert (periods.format_date(start), periods.format_date(end)) == ("2024-02-01", "2024-02-29")
+        assert periods.period_bounds("2024-12-31", "monthly")[1] == date(2024, 12, 31).toordinal()
+
+    def test_add_months_clamps_the_day(self):
+        assert periods.format_date(periods.add_months(periods.to_ordinal("2024-01-31"), 1)) == "2024-02-29"
+        assert periods.format_date(periods.add_months(periods.to_ordinal("2024-01-31"), -2)) == "2023-11-30"
+        assert periods.format_date(periods.add_months(periods.to_ordinal("2023-12-15"), 1)) == "2024-01-15"
@@ -0,0 +1,41 @@
+import os
+import pytest
+from router import ShardRouter
+
+
+class TestShardRouter:
+    @pytest.fixture
+    def router(self, tmp_path):
+        router = ShardRouter([str(tmp_path / f"shard{index}") for index in range(3)])
+        yield router
+        router.close()
+
+    def test_tenants_map_to_stable_shards(self, router, tmp_path):
+        tenants = [f"user{index}" for index in range(30)]
+        shards = {tenant: router.shard_for(tenant) for tenant in tenants}
+
+        assert len(set(shards.values())) == 3
+        assert shards == {tenant: ShardRouter(router.shard_dirs).shard_for(tenant) for tenant in tenants}
+        assert router.path_for("user1") == os.path.join(router.shard_dirs[shards["user1"]], "user1.db")
+        with pytest.raises(ValueError):
+            router.shard_for("../escape")
+
+    def test_tenant_databases_are_isolated(self, router, make_habit):
+        router.database("alice").insert_habit(make_habit(status={"2023-07-01": True, "2023-07-02": True}))
+        router.database("bob").insert_habit(make_habit(name="Read", frequency="weekly"))
+        router.database("bob").insert_habit(make_habit(name="Walk"))
+
+        assert [habit["name"] for habit in router.database("alice").fetch_habit_summaries()] == ["Exercise"]
+        assert [habit["name"] for habit in router.database("bob").fetch_habit_summaries()] == ["Read", "Walk"]
+        assert sorted(router.tenants()) == ["alice", "bob"]
+
+    def test_totals_cover_every_tenant(self, router, make_habit):
+        router.database("alice").insert_habit(make_habit(status={"2023-07-01": True, "2023-07-02": True}))
+        router.database("bob").insert_habit(make_habit(name="Read", frequency="weekly", status={"2023-07-03": True}))
+
+        for workers in (1, 2):
+            stats = router.calculate_totals(workers)
+            assert stats.total_habits == 2
+            assert stats.total_completions == 3
+            assert stats.average_frequency == {"daily": 1, "weekly": 1}
+            assert stats.longest_streak == 2
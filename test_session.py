@@ -0,0 +1,113 @@
+import sqlite3
+import time
+import pytest
+from database import Database
+from session import Session
+
+
+class TestSession:
+    @pytest.fixture
+    def db(self, tmp_path, make_habit):
+        db = Database(str(tmp_path / "habits.db"))
+        db.connect()
+        db.create_table()
+        db.insert_habits([make_habit(), make_habit(name="Read")])
+        yield db
+        db.close()
+
+    def completions(self, db):
+        return db.cursor.execute("SELECT habit_id, date FROM completions ORDER BY habit_id, date").fetchall()
+
+    def test_writes_wait_for_flush_in_order(self, db, make_habit):
+        session = Session(db)
+        session.complete_habit(1, {"2023-07-01": True})
+        session.insert_habit(make_habit(id=3, name="Walk"))
+        session.complete_habit(3, {"2023-07-02": True})
+        session.delete_habit(2)
+
+        assert self.completions(db) == []
+        assert session.pending_count() == 4
+        assert session.flush() == 4
+        assert self.completions(db) == [(1, "2023-07-01"), (3, "2023-07-02")]
+        assert [habit["name"] for habit in db.fetch_habit_summaries()] == ["Exercise", "Walk"]
+        assert session.flushes == 1
+
+    def test_reads_flush_the_writes_they_depend_on(self, db):
+        session = Session(db)
+        session.complete_habit("1", {"2023-07-01": True})  # The menus pass IDs as strings
+
+        assert session.fetch_date_range(2) == ("2023-07-01", "2023-07-31")
+        assert session.pending_count() == 1
+        assert session.has_completion_between(1, "2023-07-01", "2023-07-01")
+        assert session.pending_count() == 0
+
+        session.update_habit(2, {"name": "Study"})
+        assert [habit["name"] for habit in session.fetch_habit_summaries()] == ["Exercise", "Study"]
+        assert session.pending_count() == 0
+
+    def test_column_reads_wait_for_logged_data_only(self, db):
+        session = Session(db)
+        session.complete_habit("1", {"2023-07-01": True})
+        session.clear_habit_status(2)
+
+        assert [habit["name"] for habit in session.fetch_habit_summaries()] == ["Exercise", "Read"]
+        assert session.pending_count() == 2
+
+        session.delete_habit(2)
+        assert [habit["name"] for habit in session.fetch_habit_summaries()] == ["Exercise"]
+        assert session.pending_count() == 0
+        assert self.completions(db) == [(1, "2023-07-01")]
+
+    def test_flushes_on_size_and_interval(self, tmp_path, db):
+        session = Session(db, flush_interval=60, max_pending=3)
+        for day in (1, 2, 3):
+            session.complete_habit(1, {f"2023-07-0{day}": True})
+        assert session.pending_count() == 0
+        assert len(self.completions(db)) == 3
+
+        concurrent = Database(db.db_name, concurrent=True)
+        concurrent.connect()
+        session = Session(concurrent, flush_interval=0.05)
+        session.clear_habit_status(1)
+        deadline = time.monotonic() + 5
+        while session.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert session.flushes == 1
+        session.close()
+        assert self.completions(db) == []
+
+    def test_failed_flush_keeps_the_batch(self, db, make_habit):
+        session = Session(db)
+        session.complete_habit(1, {"2023-07-01": True})
+        session.insert_habit(make_habit(id=2))  # Duplicate ID
+
+        with pytest.raises(sqlite3.IntegrityError):
+            session.flush()
+        assert self.completions(db) == []
+        assert session.pending_count() == 2
+
+        db.delete_habit(2)
+        assert session.flush() == 2
+        assert self.completions(db) == [(1, "2023-07-01")]
+
+    def test_background_flush_reports_errors_and_retries(self, db, capsys):
+        concurrent = Database(db.db_name, concurrent=True)
+        concurrent.connect()
+        session = Session(concurrent, flush_interval=0.05)
+        locker = sqlite3.connect(db.db_name, timeout=0)
+        locker.execute("BEGIN IMMEDIATE")  # Another process holds the write lock
+        concurrent.conn.execute("PRAGMA busy_timeout = 0")
+        session.complete_habit(1, {"2023-07-01": True})
+
+        deadline = time.monotonic() + 5
+        while "database is locked" not in capsys.readouterr().err and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert session.pending_count() == 1
+
+        locker.rollback()
+        locker.close()
+        while session.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert session.pending_count() == 0
+        session.close()
+        assert self.completions(db) == [(1, "2023-07-01")]
@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+import_budget_us = 150_000  # Cumulative import time of the entry point, in microseconds
+heavy_modules = ("pandas", "numpy", "questionary", "prompt_toolkit", "tabulate")
+app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def import_times(code, *args):
+    """Run code in a fresh interpreter with -X importtime and return module -> cumulative microseconds."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code, *args],
+                            capture_output=True, text=True, check=True, cwd=os.path.dirname(app_path))
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup:
+    def test_import_time_budget(self):
+        times = import_times("import app, cli")
+
+        assert not [module for module in heavy_modules if module in times]
+        assert times["app"] + times["cli"] < import_budget_us
+
+    def test_commands_skip_menu_dependencies(self, tmp_path):
+        code = ("import sys, app; app.main(['--db', sys.argv[1], 'stats', '--json']);"
+                "app.main(['--db', sys.argv[1], 'check', '--id', '1'])")
+        times = import_times(code, str(tmp_path / "habits.db"))
+
+        assert not [module for module in heavy_modules if module in times]
+        assert "profiling" not in times  # Instrumentation is only loaded when asked for
+
+    @pytest.mark.parametrize("command", [["stats", "--json"], ["stats", "--vectorized"],
+                                         ["list", "--frequency", "weekly"]])
+    def test_commands_run_without_menu(self, tmp_path, command):
+        result = subprocess.run([sys.executable, app_path, "--db", str(tmp_path / "habits.db"), *command],
+                                capture_output=True, text=True)
+
+        assert result.returncode == 0
+
+    def test_profile_report(self, tmp_path):
+        report_path = tmp_path / "profile.json"
+        result = subprocess.run([sys.executable, app_path, "--db", str(tmp_path / "habits.db"),
+                                 "--profile-output", str(report_path), "check", "--id", "1"],
+                                capture_output=True, text=True)
+
+        report = json.loads(report_path.read_text())
+        assert result.returncode == 1  # No habit with ID 1
+        assert report["Database.fetch_date_range"]["calls"] == 1
+        assert report["Database.fetch_date_range"]["sql"] == {
+            "PRAGMA data_version": 1,  # The habit cache checks for commits by other connections
+            "SELECT id, name, description, frequency, start_date, end_date FROM habits WHERE id = ?": 1}
+        assert {"total_ms", "p50_ms", "p95_ms", "rows"} <= set(report["Database.fetch_date_range"])
+
+    @pytest.mark.parametrize("value, enabled", [("0", False), ("false", False), ("", False), ("1", True)])
+    def test_profile_environment_variable(self, tmp_path, value, enabled):
+        result = subprocess.run([sys.executable, app_path, "--db", str(tmp_path / "habits.db"), "check", "--id", "1"],
+                                capture_output=True, text=True, cwd=tmp_path, env={**os.environ, "HABITS_PROFILE": value})
+
+        assert ("Database.fetch_date_range" in result.stderr) == enabled  # The report goes to stderr
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["habits.db"]
+
+    def test_trace_and_profile_together(self, tmp_path):
+        report_path = tmp_path / "profile.json"
+        result = subprocess.run([sys.executable, app_path, "--db", str(tmp_path / "habits.db"), "--trace",
+                                 "--profile-output", str(report_path), "check", "--id", "1"],
+                                capture_output=True, text=True)
+
+        report = json.loads(report_path.read_text())
+        traced = [line for line in result.stderr.splitlines() if line.startswith("[sql] SELECT")]
+        assert "SELECT id, name, description, frequency, start_date, end_date FROM habits WHERE id = 1" in " ".join(traced)
+        assert len(traced) > 1
+        assert report["Database.fetch_date_range"]["sql"]
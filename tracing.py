@@ -0,0 +1,94 @@
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter
+
+literals = re.compile(r"X?'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")  # The trace callback sees bound values inlined
+n_plus_one = 10  # Executions of one query shape within an action that are reported as an N+1 pattern
+
+
+def query_shape(statement):
+    """Replace the values in a SQL statement with ?, so executions with different values count as one query."""
+    return literals.sub("?", statement)
+
+
+class QueryTracer:
+    """
+    A sqlite3 trace callback that logs every statement and flags wasteful queries.
+
+    Within one action (a menu choice or a command), a SELECT that runs twice with the same values
+    is reported as repeated, and one that runs n_plus_one times with different values as an N+1
+    pattern. Every distinct SELECT shape is run through EXPLAIN QUERY PLAN once, and a filtered
+    query that scans a whole table is reported as missing an index.
+    """
+
+    def __init__(self, db_name, file=sys.stderr):
+        """Initialize the tracer for the database file that is traced, writing to file."""
+        self.db_name = db_name
+        self.file = file
+        self.action = None
+        self.statements = Counter()  # SELECT text -> executions in the current action
+        self.shapes = Counter()  # SELECT text with values replaced by ? -> executions in the current action
+        self.plans = {}  # SELECT shape -> full table scans found by EXPLAIN QUERY PLAN
+        self.warnings = []
+        self.lock = threading.Lock()  # Pooled connections trace from several threads
+        self.explain_conn = None
+
+    def start_action(self, name):
+        """Start counting the queries of a new action."""
+        with self.lock:
+            self.action = name
+            self.statements.clear()
+            self.shapes.clear()
+        print(f"[sql] -- {name}", file=self.file)
+
+    def warn(self, message):
+        """Report a wasteful query."""
+        self.warnings.append(message)
+        print(f"[sql] ⚠ {message}", file=self.file)
+
+    def __call__(self, sql):
+        """Log a statement and check it."""
+        statement = " ".join(sql.split())
+        print(f"[sql] {statement}", file=self.file)
+        if not statement.upper().startswith(("SELECT", "WITH")):
+            return
+        shape = query_shape(statement)
+        with self.lock:
+            self.statements[statement] += 1
+            self.shapes[shape] += 1
+            repeated = self.statements[statement] == 2
+            n_plus_one_found = self.shapes[shape] == n_plus_one
+            new_shape = shape not in self.plans
+            if new_shape:
+                self.plans[shape] = []
+        where = f" in {self.action}" if self.action else ""
+        if repeated:
+            self.warn(f"repeated query{where}: {statement}")
+        if n_plus_one_found:
+            self.warn(f"N+1 pattern{where}, {n_plus_one}+ executions of: {shape}")
+        if new_shape:
+            self.plans[shape] = self.full_scans(statement)
+            for detail in self.plans[shape]:
+                self.warn(f"full table scan ({detail}): {shape}")
+
+    def full_scans(self, statement):
+        """Return the full table scans in the query plan of a filtered SELECT statement."""
+        if " WHERE " not in statement.upper():
+            return []  # Reading a whole table is expected without a filter
+        if self.explain_conn is None:
+            # A separate connection: a trace callback must not run statements on the traced one
+            self.explain_conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        try:
+            plan = self.explain_conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+        except sqlite3.Error:
+            return []  # e.g. a table created in a transaction that is not committed yet
+        return [detail for _, _, _, detail in plan
+                if detail.startswith("SCAN") and " USING " not in detail and detail != "SCAN CONSTANT ROW"]
+
+    def close(self):
+        """Close the connection used for EXPLAIN QUERY PLAN."""
+        if self.explain_conn is not None:
+            self.explain_conn.close()
+            self.explain_conn = None
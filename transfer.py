@@ -0,0 +1,111 @@
+import csv
+import json
+from itertools import islice
+from database import habit_columns
+
+csv_columns = ("type",) + habit_columns + ("date", "done")
+default_batch_size = 50000  # Records written per transaction on import
+parse_chunk = 5000  # NDJSON lines decoded with a single json.loads call
+
+
+def export_habits(db, file, file_format="ndjson"):
+    """
+    Stream every habit and its completions to an open text file.
+
+    Each habit record is followed by its completion records, so only one habit's history is
+    held in memory at a time.
+
+    Args:
+        db (Database): The connected database to export.
+        file: A writable text file.
+        file_format (str): "ndjson" (one JSON object per line) or "csv".
+
+    Returns:
+        tuple: The number of habits and completions written.
+    """
+    habits = 0
+    completions = 0
+    writer = csv.writer(file) if file_format == "csv" else None
+    if writer:
+        writer.writerow(csv_columns)
+    for habit in db.iter_habits():
+        habits += 1
+        if writer:
+            writer.writerow(["habit"] + [habit[column] for column in habit_columns] + ["", ""])
+            writer.writerows(["completion", habit["id"], "", "", "", "", "", date, int(done)]
+                             for date, done in habit["status"].items())
+        else:
+            record = {"type": "habit"}
+            record.update((column, habit[column]) for column in habit_columns)
+            file.write(json.dumps(record) + "\n")
+            habit_id = habit["id"]
+            file.writelines(f'{{"type": "completion", "habit_id": {habit_id}, "date": "{date}", "done": {"true" if done else "false"}}}\n'
+                            for date, done in habit["status"].items())
+        completions += len(habit["status"])
+    return habits, completions
+
+
+def read_records(file, file_format="ndjson"):
+    """Yield ("habit", habit_dict) and ("completion", (habit_id, date, done)) records from an open text file."""
+    if file_format == "csv":
+        for row in csv.DictReader(file):
+            if row["type"] == "habit":
+                habit = {column: row[column] for column in habit_columns}
+                habit["id"] = int(habit["id"])
+                yield "habit", habit
+            elif row["type"] == "completion":
+                yield "completion", (int(row["id"]), row["date"], row["done"].lower() in ("1", "true"))
+        return
+    while True:
+        lines = list(islice(file, parse_chunk))
+        if not lines:
+            return
+        # Decoding a chunk of lines as one JSON array is several times faster than one call per line
+        records = json.loads("[" + ",".join(line for line in lines if line.strip()) + "]")
+        for record in records:
+            if record["type"] == "habit":
+                yield "habit", {column: record.get(column) for column in habit_columns}
+            elif record["type"] == "completion":
+                yield "completion", (record["habit_id"], record["date"], bool(record["done"]))
+
+
+def import_habits(db, file, file_format="ndjson", batch_size=default_batch_size):
+    """
+    Stream habits and completions from an open text file into the database in batched transactions.
+
+    Habit IDs are kept. A habit record must come before its completions, as export_habits writes
+    them; completions of unknown habits are ignored.
+
+    Args:
+        db (Database): The connected database to import into.
+        file: A readable text file written by export_habits.
+        file_format (str): "ndjson" or "csv".
+        batch_size (int): The number of records written per transaction.
+
+    Returns:
+        tuple: The number of habits and completions read.
+    """
+    habits = []
+    completions = []
+    habit_count = 0
+    completion_count = 0
+
+    def flush():
+        with db.transaction():
+            db.insert_habits(habits)
+            db.complete_habit_rows(completions)
+        habits.clear()
+        completions.clear()
+
+    with db.bulk_load():
+        for kind, record in read_records(file, file_format):
+            if kind == "habit":
+                habits.append(record)
+                habit_count += 1
+            else:
+                completions.append(record)
+                completion_count += 1
+            if len(habits) + len(completions) >= batch_size:
+                flush()
+        flush()
+    return habit_count, completion_count
@@ -0,0 +1,274 @@
+from datetime import date
+import numpy as np
+from codec import bitmap_header, bitmap_version
+
+epoch_ordinal = date(1970, 1, 1).toordinal()
+
+
+class CompletionMatrix:
+    """A dense habits x days matrix of completions, one row per habit and one column per day ordinal."""
+
+    def __init__(self, ids, frequencies, start_ordinals, end_ordinals, done, first_ordinal, completions=None):
+        """Initialize the matrix with per-habit columns and the uint8 completion matrix."""
+        self.ids = list(ids)
+        self.frequencies = np.asarray(frequencies, dtype=object)
+        self.start_ordinals = np.asarray(start_ordinals, dtype=np.int64)
+        self.end_ordinals = np.asarray(end_ordinals, dtype=np.int64)
+        self.done = np.asfortranarray(done)  # Column-major, so every day column is contiguous
+        self.first_ordinal = first_ordinal
+        # Completions per habit; a matrix filled from per-period counts marks each period only once
+        self.completions = self.done.sum(axis=1, dtype=np.int64) if completions is None else np.asarray(completions, dtype=np.int64)
+
+    @classmethod
+    def from_habits(cls, habits, today=None):
+        """
+        Build the matrix from habit dictionaries; the day axis always reaches today.
+
+        Habits with "periods" instead of a status (see Database.fetch_habit_periods) get their
+        periods marked on the first day of each period, which gives the same streaks.
+        """
+        packed = []
+        completions = []
+        for habit in habits:
+            logged = habit["periods"] if "periods" in habit else habit["status"]
+            completions.append(sum(logged.values()))
+            packed.append("".join(date_str for date_str, done in logged.items() if done))
+        rows, columns = get_packed_days(range(len(habits)), packed)
+        return cls.from_days(habits, rows, columns, today, completions)
+
+    @classmethod
+    def from_database(cls, db, habits, today=None):
+        """
+        Build the matrix of habits (e.g. from Database.fetch_habit_summaries) from the database in bulk.
+
+        Every habit comes as one row of packed dates (Database.fetch_packed_periods) or one bitmap
+        BLOB (Database.fetch_daily_bitmaps) that NumPy decodes in one go, so no Python object is
+        made per completed day. Weekly and monthly periods are marked on their first day, which
+        gives the same streaks.
+        """
+        index = {habit["id"]: row for row, habit in enumerate(habits)}
+        completions = np.zeros(len(habits), dtype=np.int64)
+        rows = []
+        packed = []
+        for habit_id, period_starts, total in db.fetch_packed_periods():
+            row = index.get(habit_id)
+            if row is not None:  # Habits that were not asked for are left out
+                rows.append(row)
+                packed.append(period_starts)
+                completions[row] = total
+        packed_rows, packed_columns = get_packed_days(rows, packed)
+
+        bitmaps = [(index[habit_id], blob) for habit_id, blob in db.fetch_daily_bitmaps() if habit_id in index]
+        bitmap_rows, bitmap_columns = get_bitmap_days(*zip(*bitmaps)) if bitmaps else get_packed_days([], [])
+        completions += np.bincount(bitmap_rows, minlength=len(habits))
+
+        rows = np.concatenate((packed_rows, bitmap_rows))
+        columns = np.concatenate((packed_columns, bitmap_columns))
+        return cls.from_days(habits, rows, columns, today, completions)
+
+    @classmethod
+    def from_days(cls, habits, rows, columns, today=None, completions=None):
+        """Build the matrix from the habit row and the day ordinal of every completed day."""
+        today = (today or date.today()).toordinal()
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        first_ordinal = int(min(columns.min(), today)) if len(columns) else today
+        last_ordinal = int(max(columns.max(), today)) if len(columns) else today
+        done = np.zeros((len(habits), last_ordinal - first_ordinal + 1), dtype=np.uint8, order="F")
+        done[rows, columns - first_ordinal] = 1
+
+        return cls(
+            [habit["id"] for habit in habits],
+            [habit["frequency"] for habit in habits],
+            parse_dates([str(habit["start_date"]) for habit in habits]),
+            parse_dates([str(habit["end_date"]) for habit in habits]),
+            done,
+            first_ordinal,
+            completions,
+        )
+
+    def ordinals(self):
+        """Return the day ordinal of every column."""
+        return np.arange(self.first_ordinal, self.first_ordinal + self.done.shape[1], dtype=np.int64)
+
+    def rollup(self, frequency, rows=None):
+        """Count completions per period for the given rows, returning the period ids and a habits x periods matrix."""
+        rows = slice(None) if rows is None else rows
+        period_ids = get_period_ids(self.ordinals(), frequency)
+        starts = get_period_starts(period_ids)
+        counts = np.add.reduceat(self.done[rows], starts, axis=1, dtype=np.int32)
+        return period_ids[starts], counts
+
+
+def parse_dates(date_strings):
+    """Convert YYYY-MM-DD strings to an array of day ordinals."""
+    return np.asarray(date_strings, dtype="datetime64[D]").astype(np.int64) + epoch_ordinal
+
+
+def get_packed_days(rows, packed):
+    """
+    Unpack concatenated YYYY-MM-DD dates, 10 characters each, into day ordinals.
+
+    Args:
+        rows (list): The matrix row of every packed string.
+        packed (list): The dates of each row, concatenated into one string.
+
+    Returns:
+        tuple: The row and the day ordinal of every date, as arrays.
+    """
+    lengths = np.fromiter(map(len, packed), dtype=np.int64, count=len(packed)) // 10
+    dates = np.frombuffer("".join(packed).encode("ascii"), dtype="S10")
+    return np.repeat(np.asarray(rows, dtype=np.int64), lengths), parse_dates(dates)
+
+
+def get_bitmap_days(rows, blobs):
+    """
+    Decode the done bits of bitmap BLOBs (see codec.encode_bitmap) in one go.
+
+    Args:
+        rows (tuple): The matrix row of every BLOB.
+        blobs (tuple): The bitmap BLOBs.
+
+    Returns:
+        tuple: The row and the day ordinal of every done day, as arrays.
+    """
+    first_ordinals = []
+    done_bits = []
+    for blob in blobs:
+        version, first, days = bitmap_header.unpack_from(blob)
+        if version != bitmap_version:
+            raise ValueError(f"Unsupported bitmap status version: {version}")
+        first_ordinals.append(first)
+        done_bits.append(blob[bitmap_header.size:bitmap_header.size + (days + 7) // 8])
+    sizes = np.fromiter(map(len, done_bits), dtype=np.int64, count=len(done_bits)) * 8
+    starts = np.cumsum(sizes) - sizes  # Index of the first bit of every BLOB
+    done = np.flatnonzero(np.unpackbits(np.frombuffer(b"".join(done_bits), dtype=np.uint8), bitorder="little"))
+    blob_index = np.searchsorted(starts, done, side="right") - 1
+    ordinals = np.asarray(first_ordinals, dtype=np.int64)[blob_index] + done - starts[blob_index]
+    return np.asarray(rows, dtype=np.int64)[blob_index], ordinals
+
+
+def get_period_ids(ordinals, frequency):
+    """Map day ordinals to the index of their day, ISO week or calendar month."""
+    if frequency == "weekly":
+        return (ordinals - 1) // 7  # Ordinal 1 is a Monday, so weeks start on Mondays
+    if frequency == "monthly":
+        days = (ordinals - epoch_ordinal).astype("datetime64[D]")
+        return days.astype("datetime64[M]").astype(np.int64)
+    return ordinals
+
+
+def get_period_start_ordinals(ordinals, frequency):
+    """Map day ordinals to the ordinal of the first day of their day, ISO week or calendar month."""
+    if frequency == "weekly":
+        return ordinals - (ordinals - 1) % 7
+    if frequency == "monthly":
+        months = (ordinals - epoch_ordinal).astype("datetime64[D]").astype("datetime64[M]")
+        return months.astype("datetime64[D]").astype(np.int64) + epoch_ordinal
+    return ordinals
+
+
+def get_period_starts(period_ids):
+    """Return the column index where each run of equal period ids begins."""
+    return np.concatenate(([0], np.flatnonzero(np.diff(period_ids)) + 1))
+
+
+class RunLengths:
+    """Track the current and longest run of completed periods for many habits at once."""
+
+    def __init__(self, size):
+        """Initialize empty runs for the given number of habits."""
+        self.run = np.zeros(size, dtype=np.int32)
+        self.previous = self.run
+        self.longest = np.zeros(size, dtype=np.int32)
+
+    def update(self, completed):
+        """Extend the runs of the habits that completed the next period and reset the others."""
+        self.previous = self.run
+        self.run = (self.run + 1) * completed
+        np.maximum(self.longest, self.run, out=self.longest)
+
+    def streaks(self):
+        """
+        Return the longest and current streaks.
+
+        The current streak still counts when the last period is empty but the previous one is not.
+        """
+        current = np.where(self.run > 0, self.run, self.previous)
+        return self.longest.astype(np.int64), current.astype(np.int64)
+
+
+def get_run_streaks(periods):
+    """Calculate the longest and current run of non-zero periods for every row of a habits x periods matrix."""
+    runs = RunLengths(periods.shape[0])
+    for column in np.asfortranarray(periods > 0).T:
+        runs.update(column)
+    return runs.streaks()
+
+
+def calculate(matrix, today=None):
+    """
+    Calculate the statistics of every habit in the matrix with vectorized operations.
+
+    Args:
+        matrix (CompletionMatrix): The completions of the habits.
+        today (date): The reference date for streaks, defaults to today.
+
+    Returns:
+        dict: Arrays with one entry per habit for completions, total_days, completion_rate,
+        streak and current_streak.
+    """
+    today = (today or date.today()).toordinal()
+    size = len(matrix.ids)
+    frequencies = matrix.frequencies
+    is_weekly = frequencies == "weekly"
+    is_monthly = frequencies == "monthly"
+    completions = matrix.completions
+
+    total_days = matrix.end_ordinals - matrix.start_ordinals + 1
+    total_days = np.where(is_weekly, total_days // 7, total_days)
+    total_days = np.where(is_monthly, total_days // 30, total_days)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        completion_rate = np.round(completions / total_days, 2)
+
+    # Streaks count the completions from the period holding the start date to today's period, as
+    # Statistics.get_buckets does, so the walk runs to the end of today's month. Daily runs advance
+    # every day up to today; weekly and monthly runs when one of their periods up to today's ends.
+    start_ordinals = matrix.start_ordinals
+    for frequency, selected in (("weekly", is_weekly), ("monthly", is_monthly)):
+        start_ordinals = np.where(selected, get_period_start_ordinals(matrix.start_ordinals, frequency), start_ordinals)
+    month_start = get_period_start_ordinals(np.array([today]), "monthly")
+    month_end = int(get_period_start_ordinals(month_start + 31, "monthly")[0]) - 1
+    ordinals = matrix.ordinals()[:month_end - matrix.first_ordinal + 1]
+    runs = {frequency: RunLengths(size) for frequency in ("daily", "weekly", "monthly")}
+    period_ends = {}
+    completed = {}
+    for frequency in ("weekly", "monthly"):
+        period_ids = get_period_ids(ordinals, frequency)
+        ends = np.append(np.diff(period_ids) != 0, True) & (period_ids <= get_period_ids(np.array([today]), frequency)[0])
+        period_ends[frequency] = ends.tolist()
+        completed[frequency] = np.zeros(size, dtype=np.uint8)
+
+    for index, ordinal in enumerate(ordinals.tolist()):
+        column = matrix.done[:, index] & (start_ordinals <= ordinal)
+        if ordinal <= today:
+            runs["daily"].update(column)
+        for frequency, period_completed in completed.items():
+            np.bitwise_or(period_completed, column, out=period_completed)
+            if period_ends[frequency][index]:
+                runs[frequency].update(period_completed)
+                period_completed[:] = 0
+
+    longest, current = runs["daily"].streaks()
+    for frequency, selected in (("weekly", is_weekly), ("monthly", is_monthly)):
+        period_longest, period_current = runs[frequency].streaks()
+        longest = np.where(selected, period_longest, longest)
+        current = np.where(selected, period_current, current)
+
+    return {
+        "completions": completions,
+        "total_days": total_days,
+        "completion_rate": completion_rate,
+        "streak": longest,
+        "current_streak": current,
+    }